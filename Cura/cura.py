@@ -68,4 +68,7 @@ def main():
 		app.CuraApp(args).MainLoop()
 
 if __name__ == '__main__':
+	#Needed for the model loading worker processes in frozen Windows builds.
+	import multiprocessing
+	multiprocessing.freeze_support()
 	main()
@@ -45,6 +45,8 @@ class preferencesDialog(wx.Dialog):
 		configBase.SettingRow(right, 'auto_detect_sd')
 		configBase.SettingRow(right, 'check_for_updates')
 		configBase.SettingRow(right, 'submit_slice_information')
+		configBase.SettingRow(right, 'mesh_cache_size')
+		configBase.SettingRow(right, 'gcode_cache_size')
 
 		self.okButton = wx.Button(right, -1, 'Ok')
 		right.GetSizer().Add(self.okButton, (right.GetSizer().GetRows(), 0), flag=wx.BOTTOM, border=5)
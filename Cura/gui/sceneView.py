@@ -18,6 +18,7 @@ from OpenGL.GL import *
 from Cura.gui import printWindow
 from Cura.util import profile
 from Cura.util import meshLoader
+from Cura.util import meshLod
 from Cura.util import objectScene
 from Cura.util import resources
 from Cura.util import sliceEngine
@@ -54,6 +55,7 @@ class SceneView(openglGui.glGuiPanel):
 		self._animView = None
 		self._animZoom = None
 		self._platformMesh = {}
+		self._meshLoaders = []
 		self._isSimpleMode = True
 		self._usbPrintMonitor = printWindow.printProcessMonitor(lambda : self._queueRefresh())
 
@@ -430,6 +432,7 @@ class SceneView(openglGui.glGuiPanel):
 		self.sceneUpdated()
 
 	def OnDeleteAll(self, e):
+		self.cancelLoading()
 		while len(self._scene.objects()) > 0:
 			self._deleteObject(self._scene.objects()[0])
 		self._animView = openglGui.animation(self, self._viewTarget.copy(), numpy.array([0,0,0], numpy.float32), 0.5)
@@ -555,29 +558,54 @@ class SceneView(openglGui.glGuiPanel):
 		return False
 
 	def loadScene(self, fileList):
+		meshFilenames = []
 		for filename in fileList:
-			try:
-				ext = os.path.splitext(filename)[1].lower()
-				if ext in imageToMesh.supportedExtensions():
+			ext = os.path.splitext(filename)[1].lower()
+			if ext in imageToMesh.supportedExtensions():
+				try:
 					imageToMesh.convertImageDialog(self, filename).Show()
-					objList = []
-				else:
-					objList = meshLoader.loadMeshes(filename)
-			except:
-				traceback.print_exc()
+				except:
+					traceback.print_exc()
 			else:
-				for obj in objList:
-					if self._objectLoadShader is not None:
-						obj._loadAnim = openglGui.animation(self, 1, 0, 1.5)
-					else:
-						obj._loadAnim = None
-					self._scene.add(obj)
-					self._scene.centerAll()
-					self._selectObject(obj)
-					if obj.getScale()[0] < 1.0:
-						self.notification.message("Warning: Object scaled down.")
+				meshFilenames.append(filename)
+		if len(meshFilenames) > 0:
+			#Mesh files are loaded in the background, the objects are added to the scene when each file is done.
+			loadState = {'done': 0, 'count': len(meshFilenames)}
+			loader = meshLoader.parallelMeshLoader(meshFilenames, lambda filename, objList: wx.CallAfter(self._onMeshesLoaded, loader, loadState, filename, objList))
+			self._meshLoaders.append(loader)
+			loader.start()
+			self.notification.message(_("Loading %d files...") % (len(meshFilenames)) if len(meshFilenames) > 1 else _("Loading %s...") % (os.path.basename(meshFilenames[0])))
+		self.sceneUpdated()
+
+	def _onMeshesLoaded(self, loader, loadState, filename, objList):
+		if loader not in self._meshLoaders:
+			return
+		loadState['done'] += 1
+		if loadState['done'] >= loadState['count']:
+			self._meshLoaders.remove(loader)
+			self.notification.onClose(None)
+		else:
+			self.notification.message(_("Loaded %d of %d files...") % (loadState['done'], loadState['count']))
+		if objList is None:
+			self.notification.message(_("Failed to load %s") % (os.path.basename(filename)))
+			return
+		for obj in objList:
+			if self._objectLoadShader is not None:
+				obj._loadAnim = openglGui.animation(self, 1, 0, 1.5)
+			else:
+				obj._loadAnim = None
+			self._scene.add(obj)
+			self._scene.centerAll()
+			self._selectObject(obj)
+			if obj.getScale()[0] < 1.0:
+				self.notification.message("Warning: Object scaled down.")
 		self.sceneUpdated()
 
+	def cancelLoading(self):
+		for loader in self._meshLoaders:
+			loader.cancel()
+		self._meshLoaders = []
+
 	def _deleteObject(self, obj):
 		if obj == self._selectedObj:
 			self._selectObject(None)
@@ -587,12 +615,24 @@ class SceneView(openglGui.glGuiPanel):
 		for m in obj._meshList:
 			if m.vbo is not None and m.vbo.decRef():
 				self.glReleaseList.append(m.vbo)
+			if m.lodVboList is not None:
+				for vbo in m.lodVboList:
+					if vbo is not None:
+						self.glReleaseList.append(vbo)
+				m.lodVboList = None
+			if m.overhangColorBuffer is not None:
+				self.glReleaseList.append(m.overhangColorBuffer[2])
+				m.overhangColorBuffer = None
 		import gc
 		gc.collect()
 		self.sceneUpdated()
 
 	def _selectObject(self, obj, zoom = True):
 		if obj != self._selectedObj:
+			if self._selectedObj is not None:
+				self._selectedObj.setSelected(False)
+			if obj is not None:
+				obj.setSelected(True)
 			self._selectedObj = obj
 			self.updateProfileToControls()
 			self.updateToolButtons()
@@ -630,6 +670,9 @@ class SceneView(openglGui.glGuiPanel):
 			self.scaleZmmctrl.setValue(round(size[2], 2))
 
 	def OnKeyChar(self, keyCode):
+		if keyCode == wx.WXK_ESCAPE and len(self._meshLoaders) > 0:
+			self.cancelLoading()
+			self.notification.message(_("Loading cancelled"))
 		if keyCode == wx.WXK_DELETE or keyCode == wx.WXK_NUMPAD_DELETE or (keyCode == wx.WXK_BACK and platform.system() == "Darwin"):
 			if self._selectedObj is not None:
 				self._deleteObject(self._selectedObj)
@@ -946,23 +989,18 @@ void main(void)
 		glClearColor(1,1,1,1)
 		glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
 
-		if self.viewMode != 'gcode':
-			for n in xrange(0, len(self._scene.objects())):
-				obj = self._scene.objects()[n]
-				glColor4ub((n >> 16) & 0xFF, (n >> 8) & 0xFF, (n >> 0) & 0xFF, 0xFF)
-				self._renderObject(obj)
-
+		#Find the object under the mouse by casting a ray into the scene. The objects are drawn lowered by the object sink.
+		# The mouse ray and _mouse3Dpos are relative to the view target, the scene needs the ray in scene coordinates.
 		if self._mouseX > -1:
-			glFlush()
-			n = glReadPixels(self._mouseX, self.GetSize().GetHeight() - 1 - self._mouseY, 1, 1, GL_RGBA, GL_UNSIGNED_INT_8_8_8_8)[0][0] >> 8
-			if n < len(self._scene.objects()):
-				self._focusObj = self._scene.objects()[n]
-			else:
-				self._focusObj = None
-			f = glReadPixels(self._mouseX, self.GetSize().GetHeight() - 1 - self._mouseY, 1, 1, GL_DEPTH_COMPONENT, GL_FLOAT)[0][0]
-			#self.GetTopLevelParent().SetTitle(hex(n) + " " + str(f))
-			self._mouse3Dpos = opengl.unproject(self._mouseX, self._viewport[1] + self._viewport[3] - self._mouseY, f, self._modelMatrix, self._projMatrix, self._viewport)
-			self._mouse3Dpos -= self._viewTarget
+			p0, p1 = self.getMouseRay(self._mouseX, self._mouseY)
+			self._mouse3Dpos = p1
+			self._focusObj = None
+			if self.viewMode != 'gcode':
+				offset = self._viewTarget + numpy.array([0, 0, profile.getProfileSettingFloat('object_sink')], numpy.float64)
+				hit = self._scene.intersectRay(p0 + offset, p1 + offset)
+				if hit is not None:
+					self._focusObj = hit[0]
+					self._mouse3Dpos = hit[1] - offset
 
 		self._init3DView()
 		glTranslate(0,0,-self._zoom)
@@ -1148,19 +1186,17 @@ void main(void)
 				opengl.glDrawStringCenter(_("Loading toolpath for visualization..."))
 				glPopMatrix()
 		else:
-			#Draw the object box-shadow, so you can see where it will collide with other objects.
+			#Draw the object footprint-shadow, so you can see where it will collide with other objects.
 			if self._selectedObj is not None and len(self._scene.objects()) > 1:
-				size = self._selectedObj.getSize()[0:2] / 2 + self._scene.getObjectExtend()
+				footprint = self._selectedObj.getFootprint(self._scene.getObjectExtend())
 				glPushMatrix()
 				glTranslatef(self._selectedObj.getPosition()[0], self._selectedObj.getPosition()[1], 0)
 				glEnable(GL_BLEND)
 				glEnable(GL_CULL_FACE)
 				glColor4f(0,0,0,0.12)
-				glBegin(GL_QUADS)
-				glVertex3f(-size[0],  size[1], 0.1)
-				glVertex3f(-size[0], -size[1], 0.1)
-				glVertex3f( size[0], -size[1], 0.1)
-				glVertex3f( size[0],  size[1], 0.1)
+				glBegin(GL_POLYGON)
+				for p in footprint:
+					glVertex3f(p[0], p[1], 0.1)
 				glEnd()
 				glDisable(GL_CULL_FACE)
 				glPopMatrix()
@@ -1190,14 +1226,6 @@ void main(void)
 				glTranslate(pos[0], pos[1], pos[2])
 				self.tool.OnDraw()
 				glPopMatrix()
-		if self.viewMode == 'overhang' and not opengl.hasShaderSupport():
-			glDisable(GL_DEPTH_TEST)
-			glPushMatrix()
-			glLoadIdentity()
-			glTranslate(0,-4,-10)
-			glColor4ub(60,60,60,255)
-			opengl.glDrawStringCenter(_("Overhang view not working due to lack of OpenGL shaders support."))
-			glPopMatrix()
 
 	def _renderObject(self, obj, brightness = False, addSink = True):
 		glPushMatrix()
@@ -1216,16 +1244,72 @@ void main(void)
 		tempMatrix = opengl.convert3x3MatrixTo4x4(obj.getMatrix())
 		glMultMatrixf(tempMatrix)
 
+		#Without shaders the overhang is shown with a color per vertex, calculated with the rotation of the object.
+		overhangMatrix = None
+		if brightness and self.viewMode == 'overhang' and not opengl.hasShaderSupport():
+			overhangMatrix = obj.getMatrix()
+			if self.tempMatrix is not None and obj == self._selectedObj:
+				overhangMatrix = overhangMatrix * self.tempMatrix
+
 		n = 0
 		for m in obj._meshList:
-			if m.vbo is None:
-				m.vbo = opengl.GLVBO(m.vertexes, m.normal)
+			lodIdx = self._getMeshLod(obj, m)
+			vbo = self._getMeshVBO(m, lodIdx)
+			colorBuffer = None
 			if brightness:
-				glColor4fv(map(lambda n: n * brightness, self._objColors[n]))
+				color = map(lambda n: n * brightness, self._objColors[n])
+				glColor4fv(color)
+				if overhangMatrix is not None:
+					colorBuffer = self._getOverhangColorBuffer(m, lodIdx, overhangMatrix, color)
 				n += 1
-			m.vbo.render()
+			if colorBuffer is not None:
+				colorBuffer.bind()
+			vbo.render()
+			if colorBuffer is not None:
+				colorBuffer.unbind()
 		glPopMatrix()
 
+	#Get the level of detail to draw a mesh with, None for the full mesh. Large meshes that are small on the screen are drawn with a level of detail that has less faces.
+	def _getMeshLod(self, obj, m):
+		lodList = m.getLodList()
+		if lodList is None:
+			meshLod.requestLods(m, lambda : wx.CallAfter(self.QueueRefresh))
+			return None
+		#Size of the object on the screen in pixels, seen from the camera distance.
+		pixelSize = obj.getBoundaryCircle() * 2 / max(self._zoom, 1.0) * self.GetSize().GetHeight() / (2 * math.tan(math.radians(45.0 / 2)))
+		lodIdx = None
+		for idx in xrange(0, len(lodList)):
+			if len(lodList[idx][0]) / 3 >= pixelSize * pixelSize * 2:
+				lodIdx = idx
+		return lodIdx
+
+	def _getMeshVBO(self, m, lodIdx):
+		if lodIdx is None:
+			if m.vbo is None:
+				m.vbo = opengl.GLVBO(m.vertexes, m.getVertexNormals())
+			return m.vbo
+		lodList = m.getLodList()
+		if m.lodVboList is None:
+			m.lodVboList = [None] * len(lodList)
+		if m.lodVboList[lodIdx] is None:
+			m.lodVboList[lodIdx] = opengl.GLVBO(lodList[lodIdx][0], lodList[lodIdx][1])
+		return m.lodVboList[lodIdx]
+
+	#The overhang colors only change when the rotation, color or level of detail changes, so keep them in a buffer until then.
+	def _getOverhangColorBuffer(self, m, lodIdx, matrix, color):
+		key = (lodIdx, numpy.array(matrix, numpy.float32).tostring(), tuple(color))
+		if m.overhangColorBuffer is not None and m.overhangColorBuffer[0] is m.vertexes and m.overhangColorBuffer[1] == key:
+			return m.overhangColorBuffer[2]
+		if m.overhangColorBuffer is not None:
+			self.glReleaseList.append(m.overhangColorBuffer[2])
+		if lodIdx is None:
+			faceNormals = m.faceNormals
+		else:
+			faceNormals = m.getLodList()[lodIdx][1][::3]
+		colorBuffer = opengl.GLColorBuffer(opengl.getOverhangColors(faceNormals, matrix, math.cos(math.radians(90 - 60)), color))
+		m.overhangColorBuffer = (m.vertexes, key, colorBuffer)
+		return colorBuffer
+
 	def _drawMachine(self):
 		glEnable(GL_CULL_FACE)
 		glEnable(GL_BLEND)
@@ -194,6 +194,44 @@ class GLVBO(GLReferenceCounter):
 		if self._buffer is not None and bool(glDeleteBuffers):
 			print "VBO was not properly released!"
 
+#A buffer with a RGBA color for every vertex, to be used together with a GLVBO.
+class GLColorBuffer(GLReferenceCounter):
+	def __init__(self, colorArray):
+		super(GLColorBuffer, self).__init__()
+		if not bool(glGenBuffers):
+			self._colorArray = colorArray
+			self._buffer = None
+		else:
+			self._buffer = glGenBuffers(1)
+			glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+			glBufferData(GL_ARRAY_BUFFER, colorArray, GL_STATIC_DRAW)
+			glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+	def bind(self):
+		glEnableClientState(GL_COLOR_ARRAY)
+		if self._buffer is None:
+			glColorPointer(4, GL_FLOAT, 0, self._colorArray)
+		else:
+			glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+			glColorPointer(4, GL_FLOAT, 4*4, c_void_p(0))
+			glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+	def unbind(self):
+		glDisableClientState(GL_COLOR_ARRAY)
+
+	def release(self):
+		if self._buffer is not None:
+			glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+			glBufferData(GL_ARRAY_BUFFER, None, GL_STATIC_DRAW)
+			glBindBuffer(GL_ARRAY_BUFFER, 0)
+			glDeleteBuffers(1, [self._buffer])
+			self._buffer = None
+		self._colorArray = None
+
+	def __del__(self):
+		if self._buffer is not None and bool(glDeleteBuffers):
+			print "Color buffer was not properly released!"
+
 def glDrawStringCenter(s):
 	glRasterPos2f(0, 0)
 	glBitmap(0,0,0,0, -glGetStringSize(s)[0]/2, 0, None)
@@ -477,10 +515,10 @@ def DrawMesh(mesh, insideOut = False):
 	glEnableClientState(GL_NORMAL_ARRAY)
 	for m in mesh._meshList:
 		glVertexPointer(3, GL_FLOAT, 0, m.vertexes)
+		normals = m.getVertexNormals()
 		if insideOut:
-			glNormalPointer(GL_FLOAT, 0, m.invNormal)
-		else:
-			glNormalPointer(GL_FLOAT, 0, m.normal)
+			normals = -normals
+		glNormalPointer(GL_FLOAT, 0, normals)
 
 		#Odd, drawing in batchs is a LOT faster then drawing it all at once.
 		batchSize = 999    #Warning, batchSize needs to be dividable by 3
@@ -492,59 +530,30 @@ def DrawMesh(mesh, insideOut = False):
 			glDrawArrays(GL_TRIANGLES, i * batchSize, batchSize)
 		glDrawArrays(GL_TRIANGLES, extraStartPos, extraCount)
 
+		#Draw the back faces with two sided lighting, which flips the normals for us. So no inverted copy of the normals is needed.
 		glCullFace(GL_FRONT)
-		if insideOut:
-			glNormalPointer(GL_FLOAT, 0, m.normal)
-		else:
-			glNormalPointer(GL_FLOAT, 0, m.invNormal)
+		glLightModeli(GL_LIGHT_MODEL_TWO_SIDE, GL_TRUE)
 		for i in xrange(0, int(m.vertexCount / batchSize)):
 			glDrawArrays(GL_TRIANGLES, i * batchSize, batchSize)
-		extraStartPos = int(m.vertexCount / batchSize) * batchSize
-		extraCount = m.vertexCount - extraStartPos
 		glDrawArrays(GL_TRIANGLES, extraStartPos, extraCount)
+		glLightModeli(GL_LIGHT_MODEL_TWO_SIDE, GL_FALSE)
 		glCullFace(GL_BACK)
 
 	glDisableClientState(GL_VERTEX_ARRAY)
 	glDisableClientState(GL_NORMAL_ARRAY)
 
 
-def DrawMeshSteep(mesh, matrix, angle):
-	cosAngle = math.sin(angle / 180.0 * math.pi)
-	glDisable(GL_LIGHTING)
-	glDepthFunc(GL_EQUAL)
-	normals = (numpy.matrix(mesh.normal, copy = False) * matrix).getA()
-	for i in xrange(0, int(mesh.vertexCount), 3):
-		if normals[i][2] < -0.999999:
-			if mesh.vertexes[i + 0][2] > 0.01:
-				glColor3f(0.5, 0, 0)
-				glBegin(GL_TRIANGLES)
-				glVertex3f(mesh.vertexes[i + 0][0], mesh.vertexes[i + 0][1], mesh.vertexes[i + 0][2])
-				glVertex3f(mesh.vertexes[i + 1][0], mesh.vertexes[i + 1][1], mesh.vertexes[i + 1][2])
-				glVertex3f(mesh.vertexes[i + 2][0], mesh.vertexes[i + 2][1], mesh.vertexes[i + 2][2])
-				glEnd()
-		elif normals[i][2] < -cosAngle:
-			glColor3f(-normals[i][2], 0, 0)
-			glBegin(GL_TRIANGLES)
-			glVertex3f(mesh.vertexes[i + 0][0], mesh.vertexes[i + 0][1], mesh.vertexes[i + 0][2])
-			glVertex3f(mesh.vertexes[i + 1][0], mesh.vertexes[i + 1][1], mesh.vertexes[i + 1][2])
-			glVertex3f(mesh.vertexes[i + 2][0], mesh.vertexes[i + 2][1], mesh.vertexes[i + 2][2])
-			glEnd()
-		elif normals[i][2] > 0.999999:
-			if mesh.vertexes[i + 0][2] > 0.01:
-				glColor3f(0.5, 0, 0)
-				glBegin(GL_TRIANGLES)
-				glVertex3f(mesh.vertexes[i + 0][0], mesh.vertexes[i + 0][1], mesh.vertexes[i + 0][2])
-				glVertex3f(mesh.vertexes[i + 2][0], mesh.vertexes[i + 2][1], mesh.vertexes[i + 2][2])
-				glVertex3f(mesh.vertexes[i + 1][0], mesh.vertexes[i + 1][1], mesh.vertexes[i + 1][2])
-				glEnd()
-		elif normals[i][2] > cosAngle:
-			glColor3f(normals[i][2], 0, 0)
-			glBegin(GL_TRIANGLES)
-			glVertex3f(mesh.vertexes[i + 0][0], mesh.vertexes[i + 0][1], mesh.vertexes[i + 0][2])
-			glVertex3f(mesh.vertexes[i + 2][0], mesh.vertexes[i + 2][1], mesh.vertexes[i + 2][2])
-			glVertex3f(mesh.vertexes[i + 1][0], mesh.vertexes[i + 1][1], mesh.vertexes[i + 1][2])
-			glEnd()
-	glDepthFunc(GL_LESS)
+#getOverhangColors returns a color for every vertex of the faces, for drawing the overhang view without shaders.
+# Faces that point down more then the overhang angle after the transformation with matrix are red, all other faces get the given color.
+def getOverhangColors(faceNormals, matrix, cosAngle, color):
+	normals = (numpy.matrix(faceNormals, copy = False) * numpy.matrix(matrix, numpy.float32)).getA()
+	lens = numpy.sqrt(numpy.sum(normals * normals, 1))
+	lens[lens == 0] = 1.0
+	overhang = normals[:,2] / lens < -cosAngle
+	colors = numpy.zeros((len(faceNormals), 4), numpy.float32)
+	colors[:] = color
+	colors[overhang] = [1.0, 0.0, 0.0, color[3]]
+	return numpy.repeat(colors, 3, 0)
 
 def DrawGCodeLayer(layer, drawQuick = True):
 	filamentRadius = profile.getProfileSettingFloat('filament_diameter') / 2
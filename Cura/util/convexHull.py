@@ -0,0 +1,308 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import numpy
+
+#Directions used to find the first extreme points of a point cloud: the axes, face diagonals and corner diagonals of a cube.
+_extremeDirections = numpy.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1) if (x, y, z) > (0, 0, 0)], numpy.float64)
+#Amount of points tested against the hull at once, to limit the memory used for large meshes.
+_chunkSize = 64 * 1024
+#Amount of points tested first by hullPointSubset, to find out if testing all points is worth it.
+_sampleSize = 4096
+#Directions used to find the extreme points in 2D, in counter clockwise order.
+_directions2D = numpy.array([(numpy.cos(a), numpy.sin(a)) for a in numpy.arange(0, 256) * 2 * numpy.pi / 256], numpy.float64)
+
+#hullPointSubset returns the points that can be on the convex hull of the point cloud.
+# The convex hull of the extreme points in a few directions is build first, and all points inside of it are dropped.
+# This is a lot cheaper then the full hull, and the extremes of the points under any linear transformation are still in the result.
+# On curved meshes most points can be on the hull, so a sample is tested first. If most of the sample is kept all points are returned,
+# as testing all points would cost more than it saves.
+def hullPointSubset(points):
+	if len(points) < 8:
+		return points
+	#The extremes of a sample are points of the cloud as well, so their hull is still inside the full hull.
+	sample = points[::max(1, len(points) / (_sampleSize * 4))]
+	dist = numpy.dot(sample, _extremeDirections.transpose())
+	hull = convexHull3D(sample[numpy.unique(numpy.concatenate((numpy.argmin(dist, 0), numpy.argmax(dist, 0))))])
+	if hull is None:
+		return points
+	vertexes, faces = hull
+	normals = numpy.cross(vertexes[faces[:,1]] - vertexes[faces[:,0]], vertexes[faces[:,2]] - vertexes[faces[:,0]])
+	normals /= numpy.sqrt(numpy.sum(normals * normals, 1)).reshape((len(faces), 1))
+	offsets = numpy.sum(normals * vertexes[faces[:,0]], 1)
+	eps = numpy.max(vertexes.max(0) - vertexes.min(0)) * 1e-6
+	if len(points) > _sampleSize * 4:
+		sample = points[::len(points) / _sampleSize]
+		if numpy.sum(numpy.max(numpy.dot(sample, normals.transpose()) - offsets, 1) > -eps) * 2 > len(sample):
+			return points
+	keep = numpy.zeros(len(points), bool)
+	for start in xrange(0, len(points), _chunkSize):
+		dist = numpy.dot(points[start:start + _chunkSize], normals.transpose()) - offsets
+		keep[start:start + _chunkSize] = numpy.max(dist, 1) > -eps
+	return points[keep]
+
+#reduceHullPoints returns a few points of the cloud whose convex hull is close to the hull of all points, for dense curved meshes
+# where the exact hull has too many faces to build. The space is split in a grid of gridSize cells along the longest axis, and the point
+# farthest from the center is kept for each cell, together with the extremes. These are points of the cloud, so flat sides stay flat.
+def reduceHullPoints(points, gridSize = 32):
+	pointsMin = points.min(0)
+	cellSize = numpy.max(points.max(0) - pointsMin) / float(gridSize)
+	if len(points) < 8 or cellSize <= 0:
+		return points
+	cell = numpy.floor((points - pointsMin) / cellSize).astype(numpy.int64)
+	key = (cell[:,0] * (gridSize + 1) + cell[:,1]) * (gridSize + 1) + cell[:,2]
+	order = numpy.argsort(key)
+	key = key[order]
+	diff = points[order] - points.mean(0)
+	dist = numpy.sum(diff * diff, 1)
+	isFirst = numpy.ones(len(order), bool)
+	isFirst[1:] = key[1:] != key[:-1]
+	starts = numpy.flatnonzero(isFirst)
+	isFarthest = dist >= numpy.maximum.reduceat(dist, starts)[numpy.cumsum(isFirst) - 1]
+	#Only the first of the farthest points of each cell is kept, there can be more at the same distance.
+	key = key[isFarthest]
+	isFirst = numpy.ones(len(key), bool)
+	isFirst[1:] = key[1:] != key[:-1]
+	selected = order[isFarthest][isFirst]
+	dist = numpy.dot(points, _extremeDirections.transpose().astype(points.dtype))
+	return points[numpy.unique(numpy.concatenate((selected, numpy.argmin(dist, 0), numpy.argmax(dist, 0))))]
+
+#convexHull3D calculates the 3D convex hull of a set of points with the quickhull algorithm.
+# It returns the hull vertexes and a (n, 3) array of faces indexing those vertexes, counter clockwise as seen from the outside.
+# Returns None if the points do not span a volume (all points on a plane or a line).
+def convexHull3D(points):
+	points = numpy.array(points, numpy.float64)
+	if len(points) < 4:
+		return None
+	eps = numpy.max(points.max(0) - points.min(0)) * 1e-6
+	if eps <= 0.0:
+		return None
+
+	#Initial tetrahedron from 4 extreme points.
+	i0 = numpy.argmin(points[:,0])
+	i1 = numpy.argmax(numpy.sum((points - points[i0]) ** 2, 1))
+	lineDir = points[i1] - points[i0]
+	lineDir /= numpy.linalg.norm(lineDir)
+	diff = points - points[i0]
+	i2 = numpy.argmax(numpy.sum(numpy.cross(diff, lineDir) ** 2, 1))
+	planeNormal = numpy.cross(points[i1] - points[i0], points[i2] - points[i0])
+	if numpy.linalg.norm(planeNormal) <= eps * eps:
+		return None
+	planeNormal /= numpy.linalg.norm(planeNormal)
+	i3 = numpy.argmax(numpy.abs(numpy.dot(diff, planeNormal)))
+	if abs(numpy.dot(diff[i3], planeNormal)) <= eps:
+		return None
+
+	hull = _quickHull(points, eps)
+	center = (points[i0] + points[i1] + points[i2] + points[i3]) / 4.0
+	faceList = []
+	for a, b, c in [(i0, i1, i2), (i0, i1, i3), (i0, i2, i3), (i1, i2, i3)]:
+		normal = numpy.cross(points[b] - points[a], points[c] - points[a])
+		if numpy.dot(normal, points[a] - center) < 0:
+			b, c = c, b
+		faceList.append((a, b, c))
+	hull.assignPoints(numpy.arange(len(points)), hull.addFaces(faceList))
+	hull.run()
+	return hull.result()
+
+class _quickHull(object):
+	def __init__(self, points, eps):
+		self._points = points
+		self._eps = eps
+		self._faces = []
+		self._normals = []
+		self._offsets = []
+		self._outside = []
+		self._alive = []
+		self._edgeFace = {}
+		self._todo = []
+
+	#Add a list of (a, b, c) faces, the normals and plane offsets of all new faces are calculated at once.
+	def addFaces(self, faceList):
+		p = self._points
+		faces = numpy.array(faceList, numpy.int32).reshape((len(faceList), 3))
+		normals = numpy.cross(p[faces[:,1]] - p[faces[:,0]], p[faces[:,2]] - p[faces[:,0]])
+		normals /= numpy.sqrt(numpy.sum(normals * normals, 1)).reshape((len(faces), 1))
+		offsets = numpy.sum(normals * p[faces[:,0]], 1)
+		ret = range(len(self._faces), len(self._faces) + len(faceList))
+		for idx, (a, b, c) in zip(ret, faceList):
+			self._edgeFace[(a, b)] = idx
+			self._edgeFace[(b, c)] = idx
+			self._edgeFace[(c, a)] = idx
+		self._faces += faceList
+		self._normals += normals.tolist()
+		self._offsets += offsets.tolist()
+		self._outside += [None] * len(faceList)
+		self._alive += [True] * len(faceList)
+		return ret
+
+	def _distance(self, faceIdx, point):
+		normal = self._normals[faceIdx]
+		return normal[0] * point[0] + normal[1] * point[1] + normal[2] * point[2] - self._offsets[faceIdx]
+
+	#Assign each point to the face it is farthest outside of, faceIdxList needs to be a consecutive range of faces.
+	# Points that are not outside of any face are inside the hull and dropped.
+	def assignPoints(self, pointIdxList, faceIdxList):
+		if len(pointIdxList) < 1:
+			return
+		normals = numpy.array(self._normals[faceIdxList[0]:faceIdxList[-1] + 1])
+		offsets = numpy.array(self._offsets[faceIdxList[0]:faceIdxList[-1] + 1])
+		dist = numpy.dot(self._points[pointIdxList], normals.transpose()) - offsets
+		best = numpy.argmax(dist, 1)
+		outside = dist[numpy.arange(len(pointIdxList)), best] > self._eps
+		order = numpy.argsort(best[outside], kind='mergesort')
+		pointIdxList = pointIdxList[outside][order]
+		best = best[outside][order]
+		starts = numpy.searchsorted(best, numpy.arange(len(faceIdxList) + 1))
+		for n in numpy.nonzero(starts[1:] > starts[:-1])[0]:
+			self._outside[faceIdxList[n]] = pointIdxList[starts[n]:starts[n + 1]]
+			self._todo.append(faceIdxList[n])
+
+	def run(self):
+		p = self._points
+		while len(self._todo) > 0:
+			faceIdx = self._todo.pop()
+			if not self._alive[faceIdx] or self._outside[faceIdx] is None:
+				continue
+			outside = self._outside[faceIdx]
+			eye = outside[numpy.argmax(numpy.dot(p[outside], self._normals[faceIdx]))]
+			eyePoint = list(p[eye])
+
+			#Find all faces visible from the eye point, and the horizon edges around them.
+			visible = set([faceIdx])
+			stack = [faceIdx]
+			horizon = []
+			while len(stack) > 0:
+				f = stack.pop()
+				a, b, c = self._faces[f]
+				for edge in [(a, b), (b, c), (c, a)]:
+					neighbour = self._edgeFace[(edge[1], edge[0])]
+					if neighbour in visible:
+						continue
+					if self._distance(neighbour, eyePoint) > self._eps:
+						visible.add(neighbour)
+						stack.append(neighbour)
+					else:
+						horizon.append(edge)
+
+			pointList = []
+			for f in visible:
+				self._alive[f] = False
+				if self._outside[f] is not None:
+					pointList.append(self._outside[f])
+					self._outside[f] = None
+				a, b, c = self._faces[f]
+				for edge in [(a, b), (b, c), (c, a)]:
+					if self._edgeFace.get(edge) == f:
+						del self._edgeFace[edge]
+			newFaces = self.addFaces(map(lambda edge: (edge[0], edge[1], eye), horizon))
+			pointList = numpy.concatenate(pointList)
+			self.assignPoints(pointList[pointList != eye], newFaces)
+
+	def result(self):
+		faces = numpy.array([self._faces[n] for n in xrange(0, len(self._faces)) if self._alive[n]], numpy.int32)
+		used, faces = numpy.unique(faces.reshape(len(faces) * 3), return_inverse=True)
+		return self._points[used], faces.reshape((len(faces) / 3, 3))
+
+#convexHull2D calculates the 2D convex hull of a set of points with the monotone chain algorithm.
+# It returns the hull points in counter clockwise order.
+def convexHull2D(points):
+	points = numpy.array(points, numpy.float64)
+	if len(points) < 3:
+		return points
+	#The monotone chain is a python loop, so first drop most points inside the hull with numpy.
+	if len(points) > 256:
+		points = _hullPointSubset2D(points)
+	order = numpy.lexsort((points[:,1], points[:,0]))
+	points = points[order]
+	lower = _halfHull2D(points)
+	upper = _halfHull2D(points[::-1])
+	return numpy.concatenate((lower[:-1], upper[:-1]))
+
+#_hullPointSubset2D drops points that are inside the convex hull. The polygon of the extreme points of a sample in a lot of directions
+# is inside the hull, so the points inside that polygon can be dropped. Seen from the center of the polygon, the angle of a point tells
+# which edge of the polygon it needs to be tested against. This is repeated with a sample of the points that are left, as long as that
+# drops most of them. Everything is done after scaling the points with the covariance of the sample, so long thin shapes are as round
+# as possible. Being inside a polygon does not change under such a transformation.
+def _hullPointSubset2D(points):
+	sample = points[::max(1, len(points) / _sampleSize)]
+	center = sample.mean(0)
+	values, vectors = numpy.linalg.eigh(numpy.cov(sample.transpose()))
+	if numpy.min(values) <= 0:
+		return points
+	idx = numpy.arange(len(points))
+	scaled = numpy.dot(points - center, vectors / numpy.sqrt(values))
+	while len(idx) > 256:
+		count = len(idx)
+		sample = scaled[::max(1, len(idx) / _sampleSize)]
+		polygon = sample[numpy.argmax(numpy.dot(sample, _directions2D.transpose()), 0)]
+		#Remove repeated points, the extremes of neighbouring directions can be the same point.
+		polygon = polygon[numpy.any(polygon != numpy.roll(polygon, 1, 0), 1)]
+		if len(polygon) < 3:
+			break
+		#Start the polygon at its smallest angle, so the angles of the corners are increasing.
+		polygonCenter = polygon.mean(0)
+		angles = numpy.arctan2(polygon[:,1] - polygonCenter[1], polygon[:,0] - polygonCenter[0])
+		first = numpy.argmin(angles)
+		polygon = numpy.roll(polygon, -first, 0)
+		angles = numpy.roll(angles, -first)
+		edges = numpy.roll(polygon, -1, 0) - polygon
+		eps = numpy.max(polygon.max(0) - polygon.min(0)) * 1e-9
+		edgeIdx = numpy.searchsorted(angles, numpy.arctan2(scaled[:,1] - polygonCenter[1], scaled[:,0] - polygonCenter[0]), 'right') - 1
+		edgeIdx[edgeIdx < 0] = len(polygon) - 1
+		#The cross product of the edge with the point, a point is inside when it is left of its edge.
+		diff = scaled - polygon[edgeIdx]
+		keep = edges[edgeIdx,0] * diff[:,1] - edges[edgeIdx,1] * diff[:,0] <= eps
+		idx = idx[keep]
+		scaled = scaled[keep]
+		if len(idx) * 2 > count:
+			break
+	return points[idx]
+
+def _halfHull2D(points):
+	hull = []
+	for p in points:
+		while len(hull) >= 2 and (hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1]) - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0]) <= 0:
+			hull.pop()
+		hull.append(p)
+	return numpy.array(hull)
+
+#expandPolygon returns the convex polygon grown by a rectangle of offset[0] by offset[1] on each side (the Minkowski sum with that rectangle).
+def expandPolygon(points, offset):
+	if offset[0] == 0.0 and offset[1] == 0.0:
+		return points
+	corners = numpy.array([(-1.0,-1.0), (1.0,-1.0), (1.0,1.0), (-1.0,1.0)]) * offset
+	return convexHull2D((points.reshape((len(points), 1, 2)) + corners).reshape((len(points) * 4, 2)))
+
+#polygonsOverlap checks if two convex polygons (in counter clockwise order) overlap, with the separating axis theorem:
+# the polygons do not overlap if there is an edge normal on which their projections do not overlap. Touching polygons do not overlap.
+def polygonsOverlap(a, b):
+	if len(a) < 3 or len(b) < 3:
+		return False
+	edges = numpy.concatenate((a[1:] - a[:-1], a[:1] - a[-1:], b[1:] - b[:-1], b[:1] - b[-1:]))
+	normals = numpy.column_stack((edges[:,1], -edges[:,0]))
+	normals = normals[numpy.any(normals != 0, 1)]
+	projA = numpy.dot(normals, a.transpose())
+	projB = numpy.dot(normals, b.transpose())
+	return not numpy.any((projA.max(1) <= projB.min(1)) | (projB.max(1) <= projA.min(1)))
+
+#polygonSeparation returns the shortest move of convex polygon b that separates it from convex polygon a, as an (x, y) array,
+# or None when they do not overlap. Like polygonsOverlap this uses the separating axis theorem, the move is along the edge normal
+# on which the projections of the polygons overlap the least.
+def polygonSeparation(a, b):
+	if len(a) < 3 or len(b) < 3:
+		return None
+	edges = numpy.concatenate((a[1:] - a[:-1], a[:1] - a[-1:], b[1:] - b[:-1], b[:1] - b[-1:]))
+	normals = numpy.column_stack((edges[:,1], -edges[:,0]))
+	normals = normals[numpy.any(normals != 0, 1)]
+	normals /= numpy.sqrt(numpy.sum(normals * normals, 1)).reshape((len(normals), 1))
+	projA = numpy.dot(normals, a.transpose())
+	projB = numpy.dot(normals, b.transpose())
+	forward = projA.max(1) - projB.min(1)
+	backward = projB.max(1) - projA.min(1)
+	if numpy.any((forward <= 0) | (backward <= 0)):
+		return None
+	n = numpy.argmin(numpy.minimum(forward, backward))
+	if forward[n] <= backward[n]:
+		return normals[n] * forward[n]
+	return normals[n] * -backward[n]
@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import os
+import struct
+import shutil
+import hashlib
+import traceback
+
+from Cura.util import profile
+
+#The gcode cache stores the results of the slicing engine on disk: the gcode, the print time and the amount of filament used.
+# Slicing the same models with the same settings again (for example after toggling a setting and back) copies the gcode from the cache,
+# without running the engine.
+# Entries are keyed on the engine executable, the full engine command line (settings, positions and matrices) and the model data.
+# The gcode is stored as it comes from the engine, the post processing plugins are run again on every result.
+# The cache is bounded by the 'gcode_cache_size' preference (in MB) and the least recently used entries are removed first.
+
+_cacheMagic = 'CURAGCODECACHE01'
+_cacheExtension = '.gcodecache'
+_headerFormat = '<ddd'
+
+def getCachePath():
+	return os.path.join(profile.getBasePath(), 'gcode_cache')
+
+def getCacheSize():
+	return int(profile.getPreferenceFloat('gcode_cache_size') * 1024 * 1024)
+
+#getKey returns the cache key for running the engine on the models with the given hash. The key list holds the engine arguments
+# and everything else that changes the result, without temporary filenames.
+# The size and modification time of the engine executable stand in for the engine version, so a new engine never uses old results.
+def getKey(engineFilename, modelHash, keyList):
+	key = hashlib.sha1()
+	try:
+		stat = os.stat(engineFilename)
+		key.update('%s|%d|%f|' % (os.path.abspath(engineFilename), stat.st_size, stat.st_mtime))
+	except OSError:
+		key.update('%s|' % (engineFilename))
+	key.update(modelHash)
+	for item in keyList:
+		key.update('|%s' % (str(item)))
+	return key.hexdigest()
+
+def _cacheFilename(key):
+	return os.path.join(getCachePath(), key + _cacheExtension)
+
+#loadGCode copies the cached gcode for the key to the gcode filename, and returns the (printTimeSeconds, filamentMM) of the result.
+# Returns None if the key is not cached.
+def loadGCode(key, gcodeFilename):
+	if getCacheSize() <= 0 or key is None:
+		return None
+	try:
+		cacheFilename = _cacheFilename(key)
+		if not os.path.isfile(cacheFilename):
+			return None
+		f = open(cacheFilename, 'rb')
+		header = f.read(len(_cacheMagic) + struct.calcsize(_headerFormat))
+		if len(header) < len(_cacheMagic) + struct.calcsize(_headerFormat) or header[:len(_cacheMagic)] != _cacheMagic:
+			#Broken or from an older version, remove it so it is stored again.
+			f.close()
+			os.remove(cacheFilename)
+			return None
+		printTimeSeconds, filament1, filament2 = struct.unpack(_headerFormat, header[len(_cacheMagic):])
+		out = open(gcodeFilename, 'wb')
+		shutil.copyfileobj(f, out)
+		out.close()
+		f.close()
+		#Touch the cache file, so the least recently used files are removed first.
+		os.utime(cacheFilename, None)
+		if printTimeSeconds < 0:
+			printTimeSeconds = None
+		else:
+			printTimeSeconds = int(printTimeSeconds)
+		return printTimeSeconds, [filament1, filament2]
+	except:
+		traceback.print_exc()
+		return None
+
+#storeGCode stores the gcode file produced by the engine, with its print time and filament amounts, in the cache.
+def storeGCode(key, gcodeFilename, printTimeSeconds, filamentMM):
+	if getCacheSize() <= 0 or key is None or not os.path.isfile(gcodeFilename):
+		return
+	try:
+		if not os.path.isdir(getCachePath()):
+			os.makedirs(getCachePath())
+		cacheFilename = _cacheFilename(key)
+		if os.path.isfile(cacheFilename):
+			return
+		if printTimeSeconds is None:
+			printTimeSeconds = -1
+		tempFilename = cacheFilename + '.tmp'
+		f = open(tempFilename, 'wb')
+		f.write(_cacheMagic)
+		f.write(struct.pack(_headerFormat, printTimeSeconds, filamentMM[0], filamentMM[1]))
+		gcode = open(gcodeFilename, 'rb')
+		shutil.copyfileobj(gcode, f)
+		gcode.close()
+		f.close()
+		os.rename(tempFilename, cacheFilename)
+	except:
+		traceback.print_exc()
+		return
+	_evict()
+
+#Remove the least recently used cache files till the cache fits in the configured size again.
+def _evict():
+	try:
+		entries = []
+		for name in os.listdir(getCachePath()):
+			if not name.endswith(_cacheExtension):
+				continue
+			stat = os.stat(os.path.join(getCachePath(), name))
+			entries.append((stat.st_mtime, stat.st_size, name))
+	except OSError:
+		return
+	entries.sort()
+	totalSize = sum(map(lambda e: e[1], entries))
+	for mtime, size, name in entries:
+		if totalSize <= getCacheSize():
+			break
+		try:
+			os.remove(os.path.join(getCachePath(), name))
+			totalSize -= size
+		except OSError:
+			pass
@@ -4,10 +4,27 @@ __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AG
 import time
 import math
 import os
+import weakref
+import hashlib
+import itertools
 
 import numpy
 numpy.seterr(all='ignore')
 
+from Cura.util import convexHull
+from Cura.util import meshBVH
+
+#Every mesh caches its transformed vertexes, so the slicer, the exporters and the other users of getTransformedVertexes
+# do not need to transform the same mesh again. The cache of a mesh is valid until the matrix or position of its object changes.
+# The total size of the cache is limited, when it grows too large the cached vertexes of unselected objects are dropped first.
+_transformCacheLimit = 256 * 1024 * 1024
+#Weak references to the meshes that have cached transformed vertexes, least recently used first.
+_transformCacheList = []
+#Matrix versions are unique over all objects, so (id(obj), obj._matrixVersion) can be used as a key without keeping a reference to the object.
+_matrixVersionCounter = itertools.count(1)
+#Meshes with more vertexes that can be on the convex hull than this use a reduced hull for laying flat.
+_exactHullPointLimit = 16 * 1024
+
 class printableObject(object):
 	def __init__(self, originFilename):
 		self._originFilename = originFilename
@@ -26,6 +43,9 @@ class printableObject(object):
 		self._boundaryCircleSize = None
 		self._drawOffset = None
 		self._loadAnim = None
+		self._matrixVersion = next(_matrixVersionCounter)
+		self._selected = False
+		self._footprintCache = {}
 
 	def copy(self):
 		ret = printableObject(self._originFilename)
@@ -35,12 +55,23 @@ class printableObject(object):
 		ret._transformedSize = self._transformedSize.copy()
 		ret._boundaryCircleSize = self._boundaryCircleSize
 		ret._drawOffset = self._drawOffset.copy()
+		ret._footprintCache = self._footprintCache.copy()
 		for m in self._meshList[:]:
 			m2 = ret._addMesh()
 			m2.vertexes = m.vertexes
 			m2.vertexCount = m.vertexCount
+			m2.faceNormals = m.faceNormals
+			m2._indexedMesh = m._indexedMesh
+			m2._hullPoints = m._hullPoints
+			m2._convexHull = m._convexHull
+			m2._lodList = m._lodList
+			m2._dataHash = m._dataHash
+			m2._analysis = m._analysis
+			m2._repairedVertexes = m._repairedVertexes
+			m2._bvh = m._bvh
 			m2.vbo = m.vbo
-			m2.vbo.incRef()
+			if m2.vbo is not None:
+				m2.vbo.incRef()
 		return ret
 
 	def _addMesh(self):
@@ -55,10 +86,12 @@ class printableObject(object):
 		if numpy.max(self.getSize()) > 10000.0:
 			for m in self._meshList:
 				m.vertexes /= 1000.0
+				m._vertexesChanged()
 			self.processMatrix()
 		if numpy.max(self.getSize()) < 1.0:
 			for m in self._meshList:
 				m.vertexes *= 1000.0
+				m._vertexesChanged()
 			self.processMatrix()
 
 	def applyMatrix(self, m):
@@ -66,12 +99,15 @@ class printableObject(object):
 		self.processMatrix()
 
 	def processMatrix(self):
+		self._matrixChanged()
 		self._transformedMin = numpy.array([999999999999,999999999999,999999999999], numpy.float64)
 		self._transformedMax = numpy.array([-999999999999,-999999999999,-999999999999], numpy.float64)
 		self._boundaryCircleSize = 0
 
 		for m in self._meshList:
-			transformedVertexes = m.getTransformedVertexes()
+			transformedVertexes = m.getTransformedVertexes(False, m._getBoundsPoints())
+			if len(transformedVertexes) < 1:
+				continue
 			transformedMin = transformedVertexes.min(0)
 			transformedMax = transformedVertexes.max(0)
 			for n in xrange(0, 3):
@@ -89,6 +125,14 @@ class printableObject(object):
 		self._transformedMax -= self._drawOffset
 		self._transformedMin -= self._drawOffset
 
+	#Needs to be called after the matrix of the object is changed, so the cached transformed vertexes of all meshes are dropped.
+	# processMatrix calls this, so everything that changes the matrix and then calls processMatrix is covered.
+	def _matrixChanged(self):
+		self._matrixVersion = next(_matrixVersionCounter)
+		self._footprintCache = {}
+		for m in self._meshList:
+			m._transformCache = {}
+
 	def getName(self):
 		return self._name
 	def getOriginFilename(self):
@@ -97,8 +141,14 @@ class printableObject(object):
 		return self._position
 	def setPosition(self, newPos):
 		self._position = newPos
+		for m in self._meshList:
+			m._transformCache.pop(True, None)
 	def getMatrix(self):
 		return self._matrix
+	def isSelected(self):
+		return self._selected
+	def setSelected(self, selected):
+		self._selected = selected
 
 	def getMaximum(self):
 		return self._transformedMax
@@ -111,6 +161,21 @@ class printableObject(object):
 	def getBoundaryCircle(self):
 		return self._boundaryCircleSize
 
+	#getFootprint returns the 2D convex hull of the object as seen from above, relative to the position of the object,
+	# grown by offset[0] in X and offset[1] in Y. The result is cached until the matrix changes.
+	def getFootprint(self, offset = (0.0, 0.0)):
+		key = (float(offset[0]), float(offset[1]))
+		if key not in self._footprintCache:
+			if key == (0.0, 0.0):
+				pointList = []
+				for m in self._meshList:
+					pointList.append(m.getTransformedVertexes(False, m.getHullPoints())[:,0:2])
+				points = numpy.concatenate(pointList).astype(numpy.float64) - self._drawOffset[0:2]
+				self._footprintCache[key] = convexHull.convexHull2D(points)
+			else:
+				self._footprintCache[key] = convexHull.expandPolygon(self.getFootprint(), key)
+		return self._footprintCache[key]
+
 	def mirror(self, axis):
 		matrix = [[1,0,0], [0, 1, 0], [0, 0, 1]]
 		matrix[axis][axis] = -1
@@ -159,48 +224,69 @@ class printableObject(object):
 		self._matrix = numpy.matrix([[x,0,0],[0,y,0],[0,0,z]], numpy.float64)
 		self.processMatrix()
 
+	#layFlat rotates the object so it rests on the flat side of its convex hull with the largest contact area,
+	# out of all sides where the center of mass is above the contact area, so the object does not tip over.
 	def layFlat(self):
-		transformedVertexes = self._meshList[0].getTransformedVertexes()
-		minZvertex = transformedVertexes[transformedVertexes.argmin(0)[2]]
-		dotMin = 1.0
-		dotV = None
-		for v in transformedVertexes:
-			diff = v - minZvertex
-			len = math.sqrt(diff[0] * diff[0] + diff[1] * diff[1] + diff[2] * diff[2])
-			if len < 5:
-				continue
-			dot = (diff[2] / len)
-			if dotMin > dot:
-				dotMin = dot
-				dotV = diff
-		if dotV is None:
-			return
-		rad = -math.atan2(dotV[1], dotV[0])
-		self._matrix *= numpy.matrix([[math.cos(rad), math.sin(rad), 0], [-math.sin(rad), math.cos(rad), 0], [0,0,1]], numpy.float64)
-		rad = -math.asin(dotMin)
-		self._matrix *= numpy.matrix([[math.cos(rad), 0, math.sin(rad)], [0,1,0], [-math.sin(rad), 0, math.cos(rad)]], numpy.float64)
-
-
-		transformedVertexes = self._meshList[0].getTransformedVertexes()
-		minZvertex = transformedVertexes[transformedVertexes.argmin(0)[2]]
-		dotMin = 1.0
-		dotV = None
-		for v in transformedVertexes:
-			diff = v - minZvertex
-			len = math.sqrt(diff[1] * diff[1] + diff[2] * diff[2])
-			if len < 5:
-				continue
-			dot = (diff[2] / len)
-			if dotMin > dot:
-				dotMin = dot
-				dotV = diff
-		if dotV is None:
+		hullList = filter(lambda hull: hull is not None, map(lambda m: m.getConvexHull(), self._meshList))
+		if len(hullList) < 1:
 			return
-		if dotV[1] < 0:
-			rad = math.asin(dotMin)
+		hull = hullList[0]
+		if len(hullList) > 1:
+			hull = convexHull.convexHull3D(numpy.concatenate(map(lambda hull: hull[0], hullList)))
+			if hull is None:
+				return
+		vertexes = (numpy.matrix(hull[0], copy = False) * self._matrix).getA()
+		faces = hull[1]
+		if numpy.linalg.det(self._matrix) < 0:
+			#Mirrored, so the faces are now clockwise seen from the outside.
+			faces = faces[:,::-1]
+		v0 = vertexes[faces[:,0]]
+		v1 = vertexes[faces[:,1]]
+		v2 = vertexes[faces[:,2]]
+		normals = numpy.cross(v1 - v0, v2 - v0)
+		areas = numpy.sqrt(numpy.sum(normals * normals, 1))
+		normals /= areas.reshape((len(areas), 1))
+		areas /= 2.0
+		offsets = numpy.sum(normals * v0, 1)
+
+		#Center of mass of the hull, from the tetrahedrons between each face and a point inside the hull.
+		inside = vertexes.mean(0)
+		volumes = areas * (offsets - numpy.dot(normals, inside)) / 3.0
+		center = numpy.sum((inside + v0 + v1 + v2) / 4.0 * volumes.reshape((len(volumes), 1)), 0) / numpy.sum(volumes)
+
+		#The hull is build from triangles, group the triangles that are on the same plane into a single side.
+		size = numpy.max(vertexes.max(0) - vertexes.min(0))
+		planes = numpy.round(numpy.column_stack((normals * 1000.0, offsets * 1000.0 / size))).astype(numpy.int64)
+		order = numpy.lexsort(planes.transpose())
+		isFirst = numpy.ones(len(planes), bool)
+		isFirst[1:] = numpy.any(planes[order[1:]] != planes[order[:-1]], 1)
+		sides = numpy.zeros(len(planes), numpy.int32)
+		sides[order] = numpy.cumsum(isFirst) - 1
+		sideAreas = numpy.bincount(sides, areas)
+
+		#A side is stable if the center of mass, projected on the side, is inside one of the triangles of the side.
+		projected = center - normals * (numpy.dot(normals, center) - offsets).reshape((len(offsets), 1))
+		tolerance = -size * 1e-6
+		onTriangle = numpy.ones(len(faces), bool)
+		for a, b in [(v0, v1), (v1, v2), (v2, v0)]:
+			onTriangle &= numpy.sum(numpy.cross(b - a, projected - a) * normals, 1) >= tolerance * numpy.sqrt(numpy.sum((b - a) ** 2, 1))
+		stable = numpy.bincount(sides, onTriangle) > 0
+		if not numpy.any(stable):
+			stable[:] = True
+		best = numpy.argmax(numpy.where(stable, sideAreas, -1))
+		down = numpy.sum(normals[sides == best] * areas[sides == best].reshape((numpy.sum(sides == best), 1)), 0)
+		down /= numpy.linalg.norm(down)
+
+		#Rotate the normal of the best side to point straight down, with the smallest possible rotation.
+		axis = numpy.cross(down, [0.0, 0.0, -1.0])
+		cos = -down[2]
+		if cos < -0.999999:
+			rotation = numpy.array([[1.0, 0, 0], [0, -1.0, 0], [0, 0, -1.0]])
 		else:
-			rad = -math.asin(dotMin)
-		self.applyMatrix(numpy.matrix([[1,0,0], [0, math.cos(rad), math.sin(rad)], [0, -math.sin(rad), math.cos(rad)]], numpy.float64))
+			cross = numpy.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+			rotation = numpy.identity(3) + cross + numpy.dot(cross, cross) / (1.0 + cos)
+		#Our matrixes are applied to row vectors, so use the transpose of the column vector rotation.
+		self.applyMatrix(numpy.matrix(rotation.transpose(), numpy.float64))
 
 	def scaleUpTo(self, size):
 		vMin = self._transformedMin
@@ -215,6 +301,30 @@ class printableObject(object):
 		if scale > 0:
 			self.applyMatrix(numpy.matrix([[scale,0,0],[0,scale,0],[0,0,scale]], numpy.float64))
 
+	#intersectRay returns where the ray from p0 through p1 first hits this object, as (t, point) with point = p0 + (p1 - p0) * t,
+	# or None when the object is not hit. The ray and the point are in scene coordinates, the same as getTransformedVertexes(True).
+	def intersectRay(self, p0, p1):
+		offset = numpy.array([self._position[0], self._position[1], 0], numpy.float64) - self._drawOffset
+		p0 = numpy.array(p0, numpy.float64)
+		p1 = numpy.array(p1, numpy.float64)
+		#Test the bounding box first, so the BVH of an object is only build when the ray gets near it.
+		t0 = (self._transformedMin + self._drawOffset + offset - p0) / (p1 - p0)
+		t1 = (self._transformedMax + self._drawOffset + offset - p0) / (p1 - p0)
+		if numpy.max(numpy.fmin(t0, t1)) > numpy.min(numpy.fmax(t0, t1)) or numpy.min(numpy.fmax(t0, t1)) < 0:
+			return None
+		#Transform the ray into the coordinates of the meshes, points on the ray keep the same t.
+		invMatrix = numpy.linalg.inv(numpy.array(self._matrix, numpy.float64))
+		origin = numpy.dot(p0 - offset, invMatrix)
+		direction = numpy.dot(p1 - offset, invMatrix) - origin
+		best = None
+		for m in self._meshList:
+			hit = meshBVH.getBVH(m).intersectRay(origin, direction)
+			if hit is not None and (best is None or hit[0] < best):
+				best = hit[0]
+		if best is None:
+			return None
+		return best, p0 + (p1 - p0) * best
+
 	#Split splits an object with multiple meshes into different objects, where each object is a part of the original mesh that has
 	# connected faces. This is useful to split up plate STL files.
 	def split(self, callback):
@@ -229,34 +339,72 @@ class printableObject(object):
 	#getVertexIndexList returns an array of vertexes, and an integer array for each mesh in this object.
 	# the integer arrays are indexes into the vertex array for each triangle in the model.
 	def getVertexIndexList(self):
-		vertexMap = {}
 		vertexList = []
 		meshList = []
+		offset = 0
 		for m in self._meshList:
-			verts = m.getTransformedVertexes(True)
-			meshIdxList = []
-			for idx in xrange(0, len(verts)):
-				v = verts[idx]
-				hashNr = int(v[0] * 100) | int(v[1] * 100) << 10 | int(v[2] * 100) << 20
-				vIdx = None
-				if hashNr in vertexMap:
-					for idx2 in vertexMap[hashNr]:
-						if numpy.linalg.norm(v - vertexList[idx2]) < 0.001:
-							vIdx = idx2
-				if vIdx is None:
-					vIdx = len(vertexList)
-					vertexMap[hashNr] = [vIdx]
-					vertexList.append(v)
-				meshIdxList.append(vIdx)
-			meshList.append(numpy.array(meshIdxList, numpy.int32))
-		return numpy.array(vertexList, numpy.float32), meshList
+			vertexes, faces = m.getIndexedMesh()
+			vertexList.append(m.getTransformedVertexes(True, vertexes))
+			meshList.append(faces.reshape(len(faces) * 3) + offset)
+			offset += len(vertexes)
+		if len(vertexList) < 1:
+			return numpy.zeros((0, 3), numpy.float32), meshList
+		#Weld again after the transformation, so vertexes shared between meshes are only stored once.
+		vertexes, indexes = weldVertexes(numpy.concatenate(vertexList))
+		return numpy.array(vertexes, numpy.float32), map(lambda idx: numpy.array(indexes[idx], numpy.int32), meshList)
+
+#Mark the transform cache of a mesh as most recently used, and drop cached vertexes of other meshes when the cache grows too large.
+def _touchTransformCache(m):
+	global _transformCacheList
+	_transformCacheList = filter(lambda ref: ref() is not None and ref() is not m, _transformCacheList)
+	_transformCacheList.append(weakref.ref(m))
+	totalSize = sum(map(lambda ref: ref()._getTransformCacheSize(), _transformCacheList))
+	for selected in [False, True]:
+		for ref in _transformCacheList[:-1]:
+			if totalSize <= _transformCacheLimit:
+				return
+			other = ref()
+			if other._obj.isSelected() != selected:
+				continue
+			totalSize -= other._getTransformCacheSize()
+			other._transformCache = {}
+			_transformCacheList.remove(ref)
+
+#weldVertexes merges all vertexes that are the same within the given precision, in a single sort.
+# It returns the unique vertexes, and for each input vertex the index of its unique vertex.
+def weldVertexes(vertexes, precision = 0.001):
+	if len(vertexes) < 1:
+		return vertexes[0:0], numpy.zeros(0, numpy.int32)
+	quantized = numpy.round(vertexes / precision).astype(numpy.int64)
+	order = numpy.lexsort((quantized[:,2], quantized[:,1], quantized[:,0]))
+	quantized = quantized[order]
+	isFirst = numpy.ones(len(vertexes), bool)
+	isFirst[1:] = numpy.any(quantized[1:] != quantized[:-1], 1)
+	indexes = numpy.zeros(len(vertexes), numpy.int32)
+	indexes[order] = numpy.cumsum(isFirst) - 1
+	return vertexes[order[isFirst]], indexes
 
 class mesh(object):
 	def __init__(self, obj):
 		self.vertexes = None
 		self.vertexCount = 0
+		#Normals are stored once per face instead of once per vertex, see getVertexNormals.
+		self.faceNormals = None
 		self.vbo = None
 		self._obj = obj
+		self._indexedMesh = None
+		self._hullPoints = None
+		self._convexHull = None
+		self._transformCache = {}
+		self._lodList = None
+		self.lodVboList = None
+		self.overhangColorBuffer = None
+		self._dataHash = None
+		#Cached by the meshAnalysis module.
+		self._analysis = None
+		self._repairedVertexes = None
+		#Cached by the meshBVH module.
+		self._bvh = None
 
 	def _addFace(self, x0, y0, z0, x1, y1, z1, x2, y2, z2):
 		n = self.vertexCount
@@ -276,7 +424,7 @@ class mesh(object):
 	def _prepareFaceCount(self, faceNumber):
 		#Set the amount of faces before loading data in them. This way we can create the numpy arrays before we fill them.
 		self.vertexes = numpy.zeros((faceNumber*3, 3), numpy.float32)
-		self.normal = numpy.zeros((faceNumber*3, 3), numpy.float32)
+		self.faceNormals = numpy.zeros((faceNumber, 3), numpy.float32)
 		self.vertexCount = 0
 
 	def _calculateNormals(self):
@@ -287,85 +435,155 @@ class mesh(object):
 		normals[:,0] /= lens
 		normals[:,1] /= lens
 		normals[:,2] /= lens
-		
-		n = numpy.zeros((self.vertexCount / 3, 9), numpy.float32)
-		n[:,0:3] = normals
-		n[:,3:6] = normals
-		n[:,6:9] = normals
-		self.normal = n.reshape(self.vertexCount, 3)
-		self.invNormal = -self.normal
-
-	def _vertexHash(self, idx):
-		v = self.vertexes[idx]
-		return int(v[0] * 100) | int(v[1] * 100) << 10 | int(v[2] * 100) << 20
-
-	def _idxFromHash(self, map, idx):
-		vHash = self._vertexHash(idx)
-		for i in map[vHash]:
-			if numpy.linalg.norm(self.vertexes[i] - self.vertexes[idx]) < 0.001:
-				return i
-
-	def getTransformedVertexes(self, applyOffsets = False):
+		self.faceNormals = normals
+
+	#getVertexNormals returns the normal of every vertex, which is the normal of its face. This is only needed for drawing,
+	# so the normals are not stored 3 times for every face (and a 4th and 5th time inverted), but expanded when needed.
+	def getVertexNormals(self):
+		return numpy.repeat(self.faceNormals, 3, 0)
+
+	#Needs to be called when the vertexes are modified in place, so all cached data derived from them is dropped.
+	def _vertexesChanged(self):
+		self._indexedMesh = None
+		self._hullPoints = None
+		self._convexHull = None
+		self._transformCache = {}
+		self._lodList = None
+		self._dataHash = None
+		self._analysis = None
+		self._repairedVertexes = None
+		self._bvh = None
+
+	#getIndexedMesh returns the welded vertexes of this mesh and a (faceCount, 3) array of vertex indexes for each face.
+	# The result is cached until the vertexes of the mesh change.
+	def getIndexedMesh(self):
+		if self._indexedMesh is None or self._indexedMesh[0] is not self.vertexes:
+			vertexes, indexes = weldVertexes(self.vertexes[0:self.vertexCount])
+			self._indexedMesh = (self.vertexes, vertexes, indexes.reshape((self.vertexCount / 3, 3)))
+		return self._indexedMesh[1], self._indexedMesh[2]
+
+	#getHullPoints returns the vertexes of this mesh that can be on the convex hull, in model coordinates. These are not unique.
+	# The result is cached until the vertexes of the mesh change.
+	def getHullPoints(self):
+		if self._hullPoints is None or self._hullPoints[0] is not self.vertexes:
+			self._hullPoints = (self.vertexes, convexHull.hullPointSubset(self.vertexes[0:self.vertexCount]))
+		return self._hullPoints[1]
+
+	#Only the points that can be on the convex hull have an influence on the bounds and the boundary circle. Finding those takes longer
+	# than using all vertexes once, so these are only used when they are already known for something else and are a lot less than all vertexes.
+	def _getBoundsPoints(self):
+		if self._hullPoints is not None and self._hullPoints[0] is self.vertexes and len(self._hullPoints[1]) * 2 < self.vertexCount:
+			return self._hullPoints[1]
+		return self.vertexes[0:self.vertexCount]
+
+	#getConvexHull returns the vertexes and faces of the convex hull of this mesh, in model coordinates. Or None for flat meshes.
+	# Building the hull costs time for every hull face, so for dense curved meshes the hull of a reduced set of vertexes is used.
+	# The result is cached until the vertexes of the mesh change.
+	def getConvexHull(self):
+		if self._convexHull is None or self._convexHull[0] is not self.vertexes:
+			hullPoints = self.getHullPoints()
+			if len(hullPoints) > _exactHullPointLimit:
+				hullPoints = convexHull.reduceHullPoints(hullPoints)
+			self._convexHull = (self.vertexes, convexHull.convexHull3D(hullPoints))
+		return self._convexHull[1]
+
+	#getDataHash returns the sha512 digest of the vertex data of this mesh. The result is cached until the vertexes of the mesh change.
+	def getDataHash(self):
+		if self._dataHash is None or self._dataHash[0] is not self.vertexes:
+			self._dataHash = (self.vertexes, hashlib.sha512(numpy.ascontiguousarray(self.vertexes)).digest())
+		return self._dataHash[1]
+
+	#getLodList returns the (vertexes, normals) levels of detail for drawing this mesh, most detailed first.
+	# None when these are not build yet, see meshLod.requestLods
+	def getLodList(self):
+		if self._lodList is None or self._lodList[0] is not self.vertexes:
+			return None
+		return self._lodList[1]
+
+	#getTransformedVertexes returns the vertexes transformed by the matrix of the object, and when applyOffsets is set, placed on the build platform.
+	# When no vertexes are given the full mesh is transformed, the result is cached and should not be modified.
+	def getTransformedVertexes(self, applyOffsets = False, vertexes = None):
+		if vertexes is not None:
+			return self._transformVertexes(vertexes, applyOffsets)
+		key = (self._obj, self._obj._matrixVersion)
+		if applyOffsets:
+			key += (tuple(self._obj._position), tuple(self._obj._drawOffset))
+		if applyOffsets in self._transformCache and self._transformCache[applyOffsets][0] == key:
+			_touchTransformCache(self)
+			return self._transformCache[applyOffsets][1]
+		transformedVertexes = self._transformVertexes(self.vertexes, applyOffsets)
+		transformedVertexes.flags.writeable = False
+		self._transformCache[applyOffsets] = (key, transformedVertexes)
+		_touchTransformCache(self)
+		return transformedVertexes
+
+	def _transformVertexes(self, vertexes, applyOffsets):
+		transformedVertexes = (numpy.matrix(vertexes, copy = False) * numpy.matrix(self._obj._matrix, numpy.float32)).getA()
 		if applyOffsets:
-			pos = self._obj._position.copy()
-			pos.resize((3))
+			pos = numpy.zeros((3), numpy.float32)
+			pos[0:2] = self._obj._position[0:2]
 			pos[2] = self._obj.getSize()[2] / 2
-			offset = self._obj._drawOffset.copy()
+			offset = numpy.array(self._obj._drawOffset, numpy.float32)
 			offset[2] += self._obj.getSize()[2] / 2
-			return (numpy.matrix(self.vertexes, copy = False) * numpy.matrix(self._obj._matrix, numpy.float32)).getA() - offset + pos
-		return (numpy.matrix(self.vertexes, copy = False) * numpy.matrix(self._obj._matrix, numpy.float32)).getA()
+			transformedVertexes -= offset
+			transformedVertexes += pos
+		return transformedVertexes
+
+	def _getTransformCacheSize(self):
+		return sum(map(lambda entry: entry[1].nbytes, self._transformCache.values()))
 
 	def split(self, callback):
-		vertexMap = {}
-
-		vertexToFace = []
-		for idx in xrange(0, self.vertexCount):
-			if (idx % 100) == 0:
-				callback(idx * 100 / self.vertexCount)
-			vHash = self._vertexHash(idx)
-			if vHash not in vertexMap:
-				vertexMap[vHash] = []
-			vertexMap[vHash].append(idx)
-			vertexToFace.append([])
-
-		faceList = []
-		for idx in xrange(0, self.vertexCount, 3):
-			if (idx % 100) == 0:
-				callback(idx * 100 / self.vertexCount)
-			f = [self._idxFromHash(vertexMap, idx), self._idxFromHash(vertexMap, idx+1), self._idxFromHash(vertexMap, idx+2)]
-			vertexToFace[f[0]].append(idx / 3)
-			vertexToFace[f[1]].append(idx / 3)
-			vertexToFace[f[2]].append(idx / 3)
-			faceList.append(f)
+		vertexes, faces = self.getIndexedMesh()
+		callback(25)
+		faceLabels = _connectedComponents(len(vertexes), faces)
+		callback(50)
+		labels, faceParts = numpy.unique(faceLabels, return_inverse=True)
+		order = numpy.argsort(faceParts, kind='mergesort')
+		partEnds = numpy.cumsum(numpy.bincount(faceParts))
+		tris = self.vertexes[0:self.vertexCount].reshape((self.vertexCount / 3, 3, 3))
 
 		ret = []
-		doneSet = set()
-		for idx in xrange(0, len(faceList)):
-			if idx in doneSet:
-				continue
-			doneSet.add(idx)
-			todoList = [idx]
-			meshFaceList = []
-			while len(todoList) > 0:
-				idx = todoList.pop()
-				meshFaceList.append(idx)
-				for n in xrange(0, 3):
-					for i in vertexToFace[faceList[idx][n]]:
-						if not i in doneSet:
-							doneSet.add(i)
-							todoList.append(i)
-
+		for idx in xrange(0, len(labels)):
+			callback(50 + idx * 50 / len(labels))
+			if idx > 0:
+				partFaces = order[partEnds[idx - 1]:partEnds[idx]]
+			else:
+				partFaces = order[0:partEnds[idx]]
 			obj = printableObject(self._obj.getOriginFilename())
 			obj._matrix = self._obj._matrix.copy()
 			m = obj._addMesh()
-			m._prepareFaceCount(len(meshFaceList))
-			for idx in meshFaceList:
-				m.vertexes[m.vertexCount] = self.vertexes[faceList[idx][0]]
-				m.vertexCount += 1
-				m.vertexes[m.vertexCount] = self.vertexes[faceList[idx][1]]
-				m.vertexCount += 1
-				m.vertexes[m.vertexCount] = self.vertexes[faceList[idx][2]]
-				m.vertexCount += 1
+			m.vertexes = tris[partFaces].reshape((len(partFaces) * 3, 3))
+			m.vertexCount = len(m.vertexes)
 			obj._postProcessAfterLoad()
 			ret.append(obj)
 		return ret
+
+#_connectedComponents labels all faces that are connected trough shared vertexes with the same number.
+def _connectedComponents(vertexCount, faces):
+	edgeA = numpy.concatenate((faces[:,0], faces[:,1]))
+	edgeB = numpy.concatenate((faces[:,1], faces[:,2]))
+	return connectedLabels(vertexCount, edgeA, edgeB)[faces[:,0]]
+
+#connectedLabels gives every node of a graph the lowest node index of the connected part it belongs to.
+# This is a vectorized union-find: every round hooks the root with the highest index of every edge onto the lowest,
+# after which all paths are compressed by pointer jumping. So the amount of rounds does not depend on the size of the parts.
+def connectedLabels(nodeCount, edgeA, edgeB):
+	parent = numpy.arange(nodeCount)
+	while True:
+		rootA = parent[edgeA]
+		rootB = parent[edgeB]
+		unconnected = rootA != rootB
+		if not numpy.any(unconnected):
+			break
+		rootA = rootA[unconnected]
+		rootB = rootB[unconnected]
+		parent[numpy.maximum(rootA, rootB)] = numpy.minimum(rootA, rootB)
+		while True:
+			grandParent = parent[parent]
+			if numpy.all(grandParent == parent):
+				break
+			parent = grandParent
+		#Edges that are connected will stay connected, so only keep checking the others.
+		edgeA = edgeA[unconnected]
+		edgeB = edgeB[unconnected]
+	return parent
@@ -0,0 +1,201 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import numpy
+
+from Cura.util import mesh
+
+#Mesh analysis finds the problems in a mesh that make slicing unreliable: degenerate faces (with no area), duplicate faces,
+# edges that are not shared by exactly 2 faces (open boundaries and non-manifold edges) and neighbouring faces with inconsistent winding.
+# Everything works on the welded mesh (see mesh.getIndexedMesh) and its edge list, without python loops over the faces.
+# The analysis and the repaired mesh are cached on the mesh, so these only need to be calculated once after loading.
+
+class meshAnalysis(object):
+	def __init__(self, vertexes, faces):
+		self.faceCount = len(faces)
+		self.degenerateFaces = _degenerateFaces(vertexes, faces)
+		self.duplicateFaces = _duplicateFaces(faces) & ~self.degenerateFaces
+		validFaces = faces[~(self.degenerateFaces | self.duplicateFaces)]
+		edges, halfEdgeCount, windingOk = _edgeTable(validFaces)
+		self.boundaryEdges = edges[halfEdgeCount == 1]
+		self.nonManifoldEdges = edges[halfEdgeCount > 2]
+		self.inconsistentEdges = edges[(halfEdgeCount == 2) & ~windingOk]
+		#A negative volume means the mesh is inside out.
+		tris = vertexes[validFaces].astype(numpy.float64)
+		self.volume = numpy.sum(tris[:,0] * numpy.cross(tris[:,1], tris[:,2])) / 6.0
+		if len(self.boundaryEdges) > 0:
+			labels = mesh.connectedLabels(len(vertexes), self.boundaryEdges[:,0], self.boundaryEdges[:,1])
+			self.boundaryLoopCount = len(numpy.unique(labels[self.boundaryEdges[:,0]]))
+		else:
+			self.boundaryLoopCount = 0
+
+	def isOk(self):
+		return numpy.sum(self.degenerateFaces) + numpy.sum(self.duplicateFaces) + len(self.boundaryEdges) + len(self.nonManifoldEdges) + len(self.inconsistentEdges) == 0 and self.volume >= 0
+
+	def getMessages(self):
+		ret = []
+		if numpy.any(self.degenerateFaces):
+			ret.append('%d degenerate faces' % (numpy.sum(self.degenerateFaces)))
+		if numpy.any(self.duplicateFaces):
+			ret.append('%d duplicate faces' % (numpy.sum(self.duplicateFaces)))
+		if self.boundaryLoopCount > 0:
+			ret.append('%d holes (%d open edges)' % (self.boundaryLoopCount, len(self.boundaryEdges)))
+		if len(self.nonManifoldEdges) > 0:
+			ret.append('%d non-manifold edges' % (len(self.nonManifoldEdges)))
+		if len(self.inconsistentEdges) > 0:
+			ret.append('%d edges with inconsistent winding' % (len(self.inconsistentEdges)))
+		if self.volume < 0:
+			ret.append('inside out')
+		return ret
+
+#getAnalysis returns the meshAnalysis of a mesh, cached until the vertexes of the mesh change.
+def getAnalysis(m):
+	if m._analysis is None or m._analysis[0] is not m.vertexes:
+		vertexes, faces = m.getIndexedMesh()
+		m._analysis = (m.vertexes, meshAnalysis(vertexes, faces))
+	return m._analysis[1]
+
+#getRepairedVertexes returns the repaired triangle soup of a mesh, or the vertexes of the mesh itself if nothing needs to be repaired.
+# The result is cached until the vertexes of the mesh change.
+def getRepairedVertexes(m):
+	if m._repairedVertexes is None or m._repairedVertexes[0] is not m.vertexes:
+		if getAnalysis(m).isOk():
+			repairedVertexes = m.vertexes[0:m.vertexCount]
+		else:
+			vertexes, faces = m.getIndexedMesh()
+			vertexes, faces = repairMesh(vertexes, faces)
+			repairedVertexes = numpy.array(vertexes[faces].reshape((len(faces) * 3, 3)), numpy.float32)
+		m._repairedVertexes = (m.vertexes, repairedVertexes)
+	return m._repairedVertexes[1]
+
+#repairMesh removes degenerate and duplicate faces, makes the winding of all connected faces consistent and pointing outwards,
+# and optionally fills the simple holes. Returns the new vertexes and faces.
+def repairMesh(vertexes, faces, fillHoles = True):
+	faces = faces[~(_degenerateFaces(vertexes, faces) | _duplicateFaces(faces))]
+	faces = _orientFaces(vertexes, faces)
+	if fillHoles:
+		vertexes, faces = _fillHoles(vertexes, faces)
+	return vertexes, faces
+
+def _degenerateFaces(vertexes, faces):
+	ret = (faces[:,0] == faces[:,1]) | (faces[:,1] == faces[:,2]) | (faces[:,2] == faces[:,0])
+	tris = vertexes[faces]
+	normals = numpy.cross(tris[:,1] - tris[:,0], tris[:,2] - tris[:,0])
+	return ret | (numpy.sum(normals * normals, 1) <= 0.0)
+
+#Faces with the same 3 vertexes are duplicates, no matter the winding. The first one is not marked.
+def _duplicateFaces(faces):
+	ret = numpy.zeros(len(faces), bool)
+	if len(faces) < 2:
+		return ret
+	sortedFaces = numpy.sort(faces, 1)
+	order = numpy.lexsort((sortedFaces[:,2], sortedFaces[:,1], sortedFaces[:,0]))
+	sortedFaces = sortedFaces[order]
+	ret[order[1:]] = numpy.all(sortedFaces[1:] == sortedFaces[:-1], 1)
+	return ret
+
+#_sortedHalfEdges returns the start and end vertex of the 3 edges of every face, the order that sorts these half edges on their edge
+# (the same for both directions), the position of the first half edge of every edge in that order and the amount of half edges per edge.
+def _sortedHalfEdges(faces):
+	start = faces.reshape(len(faces) * 3)
+	end = faces[:,[1,2,0]].reshape(len(faces) * 3)
+	key = numpy.minimum(start, end).astype(numpy.int64) * (int(numpy.max(faces)) + 1) + numpy.maximum(start, end)
+	order = numpy.argsort(key, kind='mergesort')
+	sortedKey = key[order]
+	isFirst = numpy.ones(len(sortedKey), bool)
+	isFirst[1:] = sortedKey[1:] != sortedKey[:-1]
+	firstPos = numpy.nonzero(isFirst)[0]
+	halfEdgeCount = numpy.diff(numpy.append(firstPos, len(sortedKey)))
+	return start, end, order, firstPos, halfEdgeCount
+
+#_edgeTable returns the unique edges of the faces, the amount of faces using each edge,
+# and for each edge if the faces using it have a consistent winding (every edge is used once in each direction).
+def _edgeTable(faces):
+	if len(faces) < 1:
+		return numpy.zeros((0, 2), numpy.int32), numpy.zeros(0, numpy.int32), numpy.zeros(0, bool)
+	start, end, order, firstPos, halfEdgeCount = _sortedHalfEdges(faces)
+	edgeIdx = numpy.repeat(numpy.arange(len(firstPos)), halfEdgeCount)
+	forwardCount = numpy.bincount(edgeIdx, (start < end)[order])
+	first = order[firstPos]
+	edges = numpy.column_stack((numpy.minimum(start[first], end[first]), numpy.maximum(start[first], end[first])))
+	return edges, halfEdgeCount, forwardCount * 2 == halfEdgeCount
+
+#_orientFaces flips faces, so that every two faces sharing an edge use it in opposite directions, and every part has a positive volume.
+# This is the union-find of mesh.connectedLabels, with for every face a parity that tells if it is flipped compared to its parent.
+def _orientFaces(vertexes, faces):
+	if len(faces) < 1:
+		return faces
+	start, end, order, firstPos, halfEdgeCount = _sortedHalfEdges(faces)
+	#Only use the edges shared by exactly 2 faces, the faces around non-manifold edges can not be oriented consistently.
+	pairPos = firstPos[halfEdgeCount == 2]
+	halfEdgeA = order[pairPos]
+	halfEdgeB = order[pairPos + 1]
+	faceA = halfEdgeA / 3
+	faceB = halfEdgeB / 3
+	#Using the edge in the same direction means one of the two faces needs to be flipped.
+	relation = (start[halfEdgeA] == start[halfEdgeB]).astype(numpy.int8)
+
+	parent = numpy.arange(len(faces))
+	parity = numpy.zeros(len(faces), numpy.int8)
+	while True:
+		rootA = parent[faceA]
+		rootB = parent[faceB]
+		unconnected = rootA != rootB
+		if not numpy.any(unconnected):
+			break
+		hookParity = (parity[faceA] ^ parity[faceB] ^ relation)[unconnected]
+		rootA = rootA[unconnected]
+		rootB = rootB[unconnected]
+		high = numpy.maximum(rootA, rootB)
+		parent[high] = numpy.minimum(rootA, rootB)
+		parity[high] = hookParity
+		while True:
+			grandParent = parent[parent]
+			if numpy.all(grandParent == parent):
+				break
+			parity = parity ^ parity[parent]
+			parent = grandParent
+		faceA = faceA[unconnected]
+		faceB = faceB[unconnected]
+		relation = relation[unconnected]
+
+	#Flip whole parts that have a negative volume, so the normals point outwards.
+	flip = parity.astype(bool)
+	tris = vertexes[faces].astype(numpy.float64)
+	volumes = numpy.sum(tris[:,0] * numpy.cross(tris[:,1], tris[:,2]), 1)
+	volumes[flip] = -volumes[flip]
+	flip ^= (numpy.bincount(parent, volumes, len(faces)) < 0)[parent]
+	faces = faces.copy()
+	faces[flip] = faces[flip][:,[0,2,1]]
+	return faces
+
+#_fillHoles closes every simple hole (a loop of open edges where every vertex has one incoming and one outgoing open edge)
+# with a fan of faces around a new vertex in the middle of the hole.
+def _fillHoles(vertexes, faces):
+	if len(faces) < 1:
+		return vertexes, faces
+	start, end, order, firstPos, halfEdgeCount = _sortedHalfEdges(faces)
+	openEdge = order[firstPos[halfEdgeCount == 1]]
+	start = start[openEdge]
+	end = end[openEdge]
+	if len(start) < 3:
+		return vertexes, faces
+	outCount = numpy.bincount(start, minlength=len(vertexes))
+	inCount = numpy.bincount(end, minlength=len(vertexes))
+	labels = mesh.connectedLabels(len(vertexes), start, end)
+	loop = labels[start]
+	#A loop is simple when all its vertexes have exactly one incoming and one outgoing open edge.
+	badLoops = numpy.unique(loop[(outCount[start] != 1) | (inCount[start] != 1) | (outCount[end] != 1) | (inCount[end] != 1)])
+	simple = ~numpy.in1d(loop, badLoops)
+	start = start[simple]
+	end = end[simple]
+	loop = loop[simple]
+	if len(start) < 3:
+		return vertexes, faces
+	loopIds, loopIdx = numpy.unique(loop, return_inverse=True)
+	edgeCount = numpy.bincount(loopIdx).astype(numpy.float64)
+	centers = numpy.zeros((len(loopIds), 3), numpy.float64)
+	for n in xrange(0, 3):
+		centers[:,n] = numpy.bincount(loopIdx, vertexes[start, n]) / edgeCount
+	newFaces = numpy.column_stack((end, start, loopIdx + len(vertexes))).astype(faces.dtype)
+	return numpy.concatenate((vertexes, centers.astype(vertexes.dtype))), numpy.concatenate((faces, newFaces))
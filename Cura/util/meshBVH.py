@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import numpy
+
+#A bounding volume hierarchy (BVH) is a binary tree of axis aligned boxes around the faces of a mesh, used to find the faces hit by a ray
+# or touching a box without testing all faces of the mesh.
+# The tree is a complete binary tree stored as flat arrays: the children of node n are 2n+1 and 2n+2, and the leafs are all on the last level.
+# It is build a level at a time, by splitting the faces of every node at the median of their centers along the longest axis of that node.
+# Queries walk the tree a level at a time as well, so all work is done with numpy on the whole front of nodes at once.
+
+#Maximal amount of faces in a leaf.
+_leafSize = 8
+
+class meshBVH(object):
+	def __init__(self, vertexes):
+		faceCount = len(vertexes) / 3
+		tris = numpy.array(vertexes[0:faceCount * 3], numpy.float64).reshape((faceCount, 3, 3))
+		self._depth = 0
+		while (faceCount + (1 << self._depth) - 1) >> self._depth > _leafSize:
+			self._depth += 1
+
+		order = numpy.arange(faceCount)
+		centers = tris.sum(1) / 3.0
+		for depth in xrange(0, self._depth):
+			starts = self._levelStarts(depth, faceCount)
+			nodeIdx = numpy.repeat(numpy.arange(len(starts) - 1), numpy.diff(starts))
+			c = centers[order]
+			nodeMin = numpy.minimum.reduceat(c, starts[:-1])
+			extent = numpy.maximum.reduceat(c, starts[:-1]) - nodeMin
+			axis = numpy.argmax(extent, 1)
+			#Sort on the node index plus the position along the axis scaled to [0, 1), so all nodes are split with a single sort.
+			nodeAxis = numpy.arange(len(axis)), axis
+			scale = 1.0 / numpy.maximum(extent[nodeAxis] * 1.000001, 1e-30)
+			key = (c[numpy.arange(faceCount), axis[nodeIdx]] - nodeMin[nodeAxis][nodeIdx]) * scale[nodeIdx] + nodeIdx
+			order = order[numpy.argsort(key)]
+
+		self._faceOrder = order
+		self._tris = tris[order]
+		self._leafStarts = self._levelStarts(self._depth, faceCount)
+		self._triMin = self._tris.min(1)
+		self._triMax = self._tris.max(1)
+		if faceCount < 1:
+			self._nodeMin = numpy.zeros((0, 3), numpy.float64)
+			self._nodeMax = numpy.zeros((0, 3), numpy.float64)
+			return
+		levelMin = [numpy.minimum.reduceat(self._triMin, self._leafStarts[:-1])]
+		levelMax = [numpy.maximum.reduceat(self._triMax, self._leafStarts[:-1])]
+		while len(levelMin[0]) > 1:
+			levelMin.insert(0, numpy.minimum(levelMin[0][0::2], levelMin[0][1::2]))
+			levelMax.insert(0, numpy.maximum(levelMax[0][0::2], levelMax[0][1::2]))
+		self._nodeMin = numpy.concatenate(levelMin)
+		self._nodeMax = numpy.concatenate(levelMax)
+
+	#The first face of every node on a level, plus the end of the last node.
+	def _levelStarts(self, depth, faceCount):
+		return (numpy.arange((1 << depth) + 1, dtype=numpy.int64) * faceCount) >> depth
+
+	#Walk the tree, keeping the nodes for which the test returns True. Returns the indexes (in self._tris) of the faces in the leafs that are reached.
+	def _leafFaces(self, nodeTest):
+		if len(self._nodeMin) < 1:
+			return numpy.zeros(0, numpy.int64)
+		nodes = numpy.zeros(1, numpy.int64)
+		for depth in xrange(0, self._depth + 1):
+			nodes = nodes[nodeTest(self._nodeMin[nodes], self._nodeMax[nodes])]
+			if len(nodes) < 1:
+				return numpy.zeros(0, numpy.int64)
+			if depth < self._depth:
+				nodes = numpy.concatenate((nodes * 2 + 1, nodes * 2 + 2))
+		leafs = nodes - ((1 << self._depth) - 1)
+		starts = self._leafStarts[leafs]
+		counts = self._leafStarts[leafs + 1] - starts
+		offsets = numpy.cumsum(counts) - counts
+		return numpy.repeat(starts - offsets, counts) + numpy.arange(numpy.sum(counts))
+
+	#intersectRay returns the (t, faceIdx) of the first face hit by the ray origin + t * direction with t >= 0, or None if no face is hit.
+	# faceIdx is the index of the face in the vertexes this BVH was build from.
+	def intersectRay(self, origin, direction):
+		origin = numpy.array(origin, numpy.float64)
+		direction = numpy.array(direction, numpy.float64)
+		olderr = numpy.seterr(divide='ignore', invalid='ignore')
+		try:
+			invDirection = 1.0 / direction
+			def rayTest(boxMin, boxMax):
+				t0 = (boxMin - origin) * invDirection
+				t1 = (boxMax - origin) * invDirection
+				tNear = numpy.fmin(t0, t1).max(1)
+				tFar = numpy.fmax(t0, t1).min(1)
+				return (tNear <= tFar) & (tFar >= 0)
+			faces = self._leafFaces(rayTest)
+		finally:
+			numpy.seterr(**olderr)
+		if len(faces) < 1:
+			return None
+
+		#Moller-Trumbore ray/triangle intersection on all candidate faces at once.
+		tris = self._tris[faces]
+		edge1 = tris[:,1] - tris[:,0]
+		edge2 = tris[:,2] - tris[:,0]
+		p = numpy.cross(direction, edge2)
+		det = numpy.sum(edge1 * p, 1)
+		ok = numpy.abs(det) > 1e-12
+		det[~ok] = 1.0
+		s = origin - tris[:,0]
+		u = numpy.sum(s * p, 1) / det
+		q = numpy.cross(s, edge1)
+		v = numpy.dot(q, direction) / det
+		t = numpy.sum(edge2 * q, 1) / det
+		ok &= (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+		if not numpy.any(ok):
+			return None
+		best = numpy.argmin(numpy.where(ok, t, numpy.inf))
+		return t[best], self._faceOrder[faces[best]]
+
+	#facesInBox returns the indexes of the faces which bounding box touches the box from boxMin to boxMax.
+	def facesInBox(self, boxMin, boxMax):
+		boxMin = numpy.array(boxMin, numpy.float64)
+		boxMax = numpy.array(boxMax, numpy.float64)
+		def boxTest(nodeMin, nodeMax):
+			return numpy.all(nodeMin <= boxMax, 1) & numpy.all(nodeMax >= boxMin, 1)
+		faces = self._leafFaces(boxTest)
+		faces = faces[boxTest(self._triMin[faces], self._triMax[faces])]
+		return numpy.sort(self._faceOrder[faces])
+
+#getBVH returns the BVH of a mesh, cached until the vertexes of the mesh change.
+def getBVH(m):
+	if m._bvh is None or m._bvh[0] is not m.vertexes:
+		m._bvh = (m.vertexes, meshBVH(m.vertexes[0:m.vertexCount]))
+	return m._bvh[1]
@@ -0,0 +1,178 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import os
+import struct
+import hashlib
+import traceback
+
+import numpy
+
+from Cura.util import mesh
+from Cura.util import profile
+
+#The mesh cache stores the vertexes and face normals of loaded model files on disk, after all post processing is done.
+# Loading a model that is in the cache maps the arrays straight from the cache file, without parsing or calculating anything.
+# The bounds of each object are stored as well, so the vertexes are not even read until they are drawn or sliced.
+# Entries are keyed on the path, size and modification time of the model file (and optionally a hash of the contents).
+# The cache is bounded by the 'mesh_cache_size' preference (in MB) and the least recently used entries are removed first.
+
+_cacheMagic = 'CURAMESHCACHE003'
+_cacheExtension = '.meshcache'
+_dataAlignment = 16
+#Per object: a flag if the bounds are valid, the transformed min and max, the draw offset and the boundary circle size.
+_boundsFormat = '<I10d'
+
+def getCachePath():
+	return os.path.join(profile.getBasePath(), 'mesh_cache')
+
+def getCacheSize():
+	return int(profile.getPreferenceFloat('mesh_cache_size') * 1024 * 1024)
+
+def _cacheKey(filename, contentHash):
+	stat = os.stat(filename)
+	key = hashlib.sha1()
+	path = os.path.abspath(filename)
+	if type(path) is unicode:
+		path = path.encode('utf-8')
+	key.update(path)
+	key.update('|%d|%f' % (stat.st_size, stat.st_mtime))
+	if contentHash:
+		f = open(filename, 'rb')
+		while True:
+			data = f.read(1024 * 1024)
+			if len(data) < 1:
+				break
+			key.update(data)
+		f.close()
+	return key.hexdigest()
+
+def _cacheFilename(filename, contentHash):
+	return os.path.join(getCachePath(), _cacheKey(filename, contentHash) + _cacheExtension)
+
+def _align(offset):
+	return (offset + _dataAlignment - 1) / _dataAlignment * _dataAlignment
+
+def isCached(filename, contentHash = False):
+	if getCacheSize() <= 0 or not os.path.isfile(filename):
+		return False
+	try:
+		return os.path.isfile(_cacheFilename(filename, contentHash))
+	except OSError:
+		return False
+
+#loadMeshes returns the list of printableObjects for a model file from the cache, or None if the file is not cached.
+def loadMeshes(filename, contentHash = False):
+	if getCacheSize() <= 0 or not os.path.isfile(filename):
+		return None
+	try:
+		cacheFilename = _cacheFilename(filename, contentHash)
+		if not os.path.isfile(cacheFilename):
+			return None
+		f = open(cacheFilename, 'rb')
+		header = f.read(len(_cacheMagic) + 4)
+		if len(header) < len(_cacheMagic) + 4 or header[:len(_cacheMagic)] != _cacheMagic:
+			#Broken or from an older version, remove it so it is stored again.
+			f.close()
+			os.remove(cacheFilename)
+			return None
+		objectCount = struct.unpack('<I', header[len(_cacheMagic):])[0]
+		meshCountList = []
+		boundsList = []
+		for n in xrange(0, objectCount):
+			meshCount = struct.unpack('<I', f.read(4))[0]
+			meshCountList.append(struct.unpack('<%dI' % (meshCount), f.read(4 * meshCount)))
+			boundsList.append(struct.unpack(_boundsFormat, f.read(struct.calcsize(_boundsFormat))))
+		offset = _align(f.tell())
+		f.close()
+
+		#Copy-on-write mappings, the arrays are only copied into memory if somebody modifies them.
+		ret = []
+		for vertexCountList, bounds in zip(meshCountList, boundsList):
+			obj = mesh.printableObject(filename)
+			for vertexCount in vertexCountList:
+				m = obj._addMesh()
+				m.vertexes = numpy.memmap(cacheFilename, numpy.float32, 'c', offset, (vertexCount, 3))
+				offset = _align(offset + vertexCount * 3 * 4)
+				m.faceNormals = numpy.memmap(cacheFilename, numpy.float32, 'c', offset, (vertexCount / 3, 3))
+				offset = _align(offset + vertexCount / 3 * 3 * 4)
+				m.vertexCount = vertexCount
+			if bounds[0]:
+				obj._matrixChanged()
+				obj._transformedMin = numpy.array(bounds[1:4], numpy.float64)
+				obj._transformedMax = numpy.array(bounds[4:7], numpy.float64)
+				obj._transformedSize = obj._transformedMax - obj._transformedMin
+				obj._drawOffset = numpy.array(bounds[7:10], numpy.float64)
+				obj._boundaryCircleSize = bounds[10]
+			else:
+				obj.processMatrix()
+			ret.append(obj)
+		#Touch the cache file, so the least recently used files are removed first.
+		os.utime(cacheFilename, None)
+		return ret
+	except:
+		traceback.print_exc()
+		return None
+
+#storeMeshes stores the freshly loaded printableObjects of a model file in the cache.
+def storeMeshes(filename, objects, contentHash = False):
+	if getCacheSize() <= 0 or len(objects) < 1:
+		return
+	for obj in objects:
+		for m in obj._meshList:
+			if m.vertexCount < 3:
+				return
+	try:
+		if not os.path.isdir(getCachePath()):
+			os.makedirs(getCachePath())
+		cacheFilename = _cacheFilename(filename, contentHash)
+		if os.path.isfile(cacheFilename):
+			return
+		tempFilename = cacheFilename + '.tmp'
+		f = open(tempFilename, 'wb')
+		f.write(_cacheMagic)
+		f.write(struct.pack('<I', len(objects)))
+		for obj in objects:
+			f.write(struct.pack('<I', len(obj._meshList)))
+			f.write(struct.pack('<%dI' % (len(obj._meshList)), *map(lambda m: m.vertexCount, obj._meshList)))
+			f.write(_packBounds(obj))
+		for obj in objects:
+			for m in obj._meshList:
+				for data in [m.vertexes[0:m.vertexCount], m.faceNormals[0:m.vertexCount / 3]]:
+					f.write('\0' * (_align(f.tell()) - f.tell()))
+					f.write(numpy.array(data, numpy.float32).tostring())
+		f.close()
+		os.rename(tempFilename, cacheFilename)
+	except:
+		traceback.print_exc()
+		return
+	_evict()
+
+#The bounds are only valid for objects without a matrix, as the matrix is not stored and the loaded objects start without one.
+def _packBounds(obj):
+	if obj._transformedMin is None or not numpy.all(obj._matrix == numpy.identity(3)):
+		return struct.pack(_boundsFormat, 0, *([0.0] * 10))
+	return struct.pack(_boundsFormat, 1, *(list(obj._transformedMin) + list(obj._transformedMax) + list(obj._drawOffset) + [obj._boundaryCircleSize]))
+
+#Remove the least recently used cache files till the cache fits in the configured size again.
+def _evict():
+	try:
+		entries = []
+		for name in os.listdir(getCachePath()):
+			if not name.endswith(_cacheExtension):
+				continue
+			stat = os.stat(os.path.join(getCachePath(), name))
+			entries.append((stat.st_mtime, stat.st_size, name))
+	except OSError:
+		return
+	entries.sort()
+	totalSize = sum(map(lambda e: e[1], entries))
+	for mtime, size, name in entries:
+		if totalSize <= getCacheSize():
+			break
+		try:
+			os.remove(os.path.join(getCachePath(), name))
+			totalSize -= size
+		except OSError:
+			#On Windows files that are still mapped cannot be removed, these will be removed at a later time.
+			pass
@@ -2,11 +2,16 @@ from __future__ import absolute_import
 __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
 
 import os
+import threading
+import traceback
+import multiprocessing
 
 from Cura.util.meshLoaders import stl
 from Cura.util.meshLoaders import obj
 from Cura.util.meshLoaders import dae
 from Cura.util.meshLoaders import amf
+from Cura.util import meshCache
+from Cura.util import mesh
 
 def loadSupportedExtensions():
 	return ['.stl', '.obj', '.dae', '.amf']
@@ -28,7 +33,17 @@ def saveWildcardFilter():
 # AMF can contain whole scenes of objects with each object having multiple meshes.
 # DAE files are a mess, but they can contain scenes of objects as well as grouped meshes
 
+# Loaded files are stored in the mesh cache, so the next time the same file is loaded it can be mapped from the cache instead.
+
 def loadMeshes(filename):
+	objects = meshCache.loadMeshes(filename)
+	if objects is not None:
+		return objects
+	objects = _loadMeshes(filename)
+	meshCache.storeMeshes(filename, objects)
+	return objects
+
+def _loadMeshes(filename):
 	ext = os.path.splitext(filename)[1].lower()
 	if ext == '.stl':
 		return stl.loadScene(filename)
@@ -41,6 +56,114 @@ def loadMeshes(filename):
 	print 'Error: Unknown model extension: %s' % (ext)
 	return []
 
+#parallelMeshLoader loads a list of model files in a pool of worker processes, so loading many files scales with the amount of cores.
+# The callback is called from a background thread with the filename and the list of printableObjects (None if loading failed),
+# in the order the files finish loading. Files in the mesh cache are mapped directly by the background thread, only the other files
+# are send to the workers. The vertex data is passed back trough the memory mapped mesh cache when possible.
+class parallelMeshLoader(object):
+	def __init__(self, filenames, callback):
+		self._filenames = filenames[:]
+		self._callback = callback
+		self._cancelled = False
+		self._thread = threading.Thread(target=self._loadThread)
+		self._thread.daemon = True
+
+	def start(self):
+		self._thread.start()
+
+	#Only the background thread uses the pool, it stops the workers as soon as it sees the cancel. Terminating the pool from here
+	# while the background thread waits for a result can block forever.
+	def cancel(self):
+		self._cancelled = True
+
+	def isDone(self):
+		return not self._thread.isAlive()
+
+	def _loadThread(self):
+		filenames = []
+		for filename in self._filenames:
+			if self._cancelled:
+				return
+			objects = meshCache.loadMeshes(filename)
+			if objects is None:
+				filenames.append(filename)
+			else:
+				self._callback(filename, objects)
+		if len(filenames) < 1:
+			return
+		try:
+			pool = multiprocessing.Pool(min(len(filenames), multiprocessing.cpu_count()))
+		except:
+			#No multiprocessing support, just load the files one by one in this thread.
+			traceback.print_exc()
+			for filename in filenames:
+				if self._cancelled:
+					return
+				try:
+					objects = loadMeshes(filename)
+				except:
+					traceback.print_exc()
+					objects = None
+				self._callback(filename, objects)
+			return
+		try:
+			results = pool.imap_unordered(_loadMeshesWorker, filenames)
+			for n in xrange(0, len(filenames)):
+				filename, data = self._nextResult(results)
+				if self._cancelled:
+					break
+				if data is None:
+					objects = None
+				elif data is True:
+					objects = meshCache.loadMeshes(filename)
+					if objects is None:
+						objects = loadMeshes(filename)
+				else:
+					objects = _objectsFromArrays(filename, data)
+				self._callback(filename, objects)
+		except:
+			traceback.print_exc()
+		if self._cancelled:
+			pool.terminate()
+		else:
+			pool.close()
+		pool.join()
+
+	#Waits for the next result of the workers, a little while at a time so a cancel is noticed. Returns (None, None) when cancelled.
+	def _nextResult(self, results):
+		while not self._cancelled:
+			try:
+				return results.next(0.1)
+			except multiprocessing.TimeoutError:
+				pass
+		return None, None
+
+#Runs in the worker process, for files that are not in the mesh cache. Returns True when the result can be mapped from the mesh cache,
+# else the vertex and face normal arrays of every mesh.
+def _loadMeshesWorker(filename):
+	try:
+		objects = _loadMeshes(filename)
+		meshCache.storeMeshes(filename, objects)
+		if meshCache.isCached(filename):
+			return filename, True
+		return filename, map(lambda obj: map(lambda m: (m.vertexes, m.faceNormals), obj._meshList), objects)
+	except:
+		traceback.print_exc()
+		return filename, None
+
+def _objectsFromArrays(filename, data):
+	ret = []
+	for meshDataList in data:
+		obj = mesh.printableObject(filename)
+		for vertexes, faceNormals in meshDataList:
+			m = obj._addMesh()
+			m.vertexes = vertexes
+			m.faceNormals = faceNormals
+			m.vertexCount = len(vertexes)
+		obj.processMatrix()
+		ret.append(obj)
+	return ret
+
 def saveMeshes(filename, objects):
 	ext = os.path.splitext(filename)[1].lower()
 	if ext == '.stl':
@@ -4,6 +4,8 @@ __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AG
 import cStringIO as StringIO
 import zipfile
 import os
+import array
+import numpy
 try:
 	from xml.etree import cElementTree as ElementTree
 except:
@@ -15,69 +17,91 @@ from Cura.util import profile
 def loadScene(filename):
 	try:
 		zfile = zipfile.ZipFile(filename)
-		xml = zfile.read(zfile.namelist()[0])
-		zfile.close()
+		f = zfile.open(zfile.namelist()[0])
 	except zipfile.BadZipfile:
-		f = open(filename, "r")
-		xml = f.read()
-		f.close()
-	amf = ElementTree.fromstring(xml)
+		zfile = None
+		f = open(filename, "rb")
+
+	#Parse the XML incrementally, every processed vertex and triangle element is removed from the tree directly,
+	# so we never have the whole document in memory. The vertexes and triangle indexes are collected in compact arrays.
+	ret = []
+	scale = 1.0
+	obj = None
+	vertexList = array.array('f')
+	vertexes = None
+	indexList = array.array('i')
+	elementStack = []
+	for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+		if event == 'start':
+			if element.tag == 'amf':
+				scale = _unitScale(element)
+			elif element.tag == 'object':
+				obj = mesh.printableObject(filename)
+			elif element.tag == 'mesh':
+				vertexList = array.array('f')
+				vertexes = None
+			elif element.tag == 'volume':
+				indexList = array.array('i')
+			elementStack.append(element)
+			continue
+
+		elementStack.pop()
+		if element.tag == 'coordinates':
+			v = [0.0,0.0,0.0]
+			for t in element:
+				if t.tag == 'x':
+					v[0] = float(t.text)
+				elif t.tag == 'y':
+					v[1] = float(t.text)
+				elif t.tag == 'z':
+					v[2] = float(t.text)
+			vertexList.extend(v)
+		elif element.tag == 'triangle':
+			v = [0,0,0]
+			for t in element:
+				if t.tag == 'v1':
+					v[0] = int(t.text)
+				elif t.tag == 'v2':
+					v[1] = int(t.text)
+				elif t.tag == 'v3':
+					v[2] = int(t.text)
+			indexList.extend(v)
+		elif element.tag == 'vertices':
+			vertexes = numpy.frombuffer(vertexList, numpy.float32).reshape((len(vertexList) / 3, 3)) * scale
+		elif element.tag == 'volume' and obj is not None and vertexes is not None:
+			m = obj._addMesh()
+			m.vertexes = vertexes[numpy.frombuffer(indexList, numpy.int32)]
+			m.vertexCount = len(m.vertexes)
+		elif element.tag == 'object' and obj is not None:
+			obj._postProcessAfterLoad()
+			ret.append(obj)
+			obj = None
+
+		if element.tag in ('vertex', 'triangle', 'volume', 'vertices', 'mesh', 'object') and len(elementStack) > 0:
+			elementStack[-1].remove(element)
+	f.close()
+	if zfile is not None:
+		zfile.close()
+
+	return ret
+
+def _unitScale(amf):
 	if 'unit' in amf.attrib:
 		unit = amf.attrib['unit'].lower()
 	else:
 		unit = 'millimeter'
 	if unit == 'millimeter':
-		scale = 1.0
+		return 1.0
 	elif unit == 'meter':
-		scale = 1000.0
+		return 1000.0
 	elif unit == 'inch':
-		scale = 25.4
+		return 25.4
 	elif unit == 'feet':
-		scale = 304.8
+		return 304.8
 	elif unit == 'micron':
-		scale = 0.001
-	else:
-		print "Unknown unit in amf: %s" % (unit)
-		scale = 1.0
-
-	ret = []
-	for amfObj in amf.iter('object'):
-		obj = mesh.printableObject(filename)
-		for amfMesh in amfObj.iter('mesh'):
-			vertexList = []
-			for vertices in amfMesh.iter('vertices'):
-				for vertex in vertices.iter('vertex'):
-					for coordinates in vertex.iter('coordinates'):
-						v = [0.0,0.0,0.0]
-						for t in coordinates:
-							if t.tag == 'x':
-								v[0] = float(t.text)
-							elif t.tag == 'y':
-								v[1] = float(t.text)
-							elif t.tag == 'z':
-								v[2] = float(t.text)
-						vertexList.append(v)
-
-			for volume in amfMesh.iter('volume'):
-				m = obj._addMesh()
-				count = 0
-				for triangle in volume.iter('triangle'):
-					count += 1
-				m._prepareFaceCount(count)
-
-				for triangle in volume.iter('triangle'):
-					for t in triangle:
-						if t.tag == 'v1':
-							v1 = vertexList[int(t.text)]
-						elif t.tag == 'v2':
-							v2 = vertexList[int(t.text)]
-						elif t.tag == 'v3':
-							v3 = vertexList[int(t.text)]
-							m._addFace(v1[0], v1[1], v1[2], v2[0], v2[1], v2[2], v3[0], v3[1], v3[2])
-		obj._postProcessAfterLoad()
-		ret.append(obj)
-
-	return ret
+		return 0.001
+	print "Unknown unit in amf: %s" % (unit)
+	return 1.0
 
 def saveScene(filename, objects):
 	f = open(filename, 'wb')
@@ -2,14 +2,32 @@ from __future__ import absolute_import
 __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
 
 import os
+import array
+
+import numpy
+
 from Cura.util import mesh
 
+#Maximum amount of meshes we split an OBJ file into, one for each extruder. Files with more groups or materials are loaded as a single mesh.
+_maxMeshCount = 4
+
 def loadScene(filename):
 	obj = mesh.printableObject(filename)
-	m = obj._addMesh()
 
-	vertexList = []
-	faceList = []
+	#Collect the raw data in growable arrays, everything else is done with numpy after the file is read.
+	vertexList = array.array('f')
+	indexList = array.array('i')
+	#For every face: the amount of vertexes, the amount of vertexes read before the face (for relative indexes) and the group it belongs to.
+	faceSizeList = array.array('i')
+	faceBaseList = array.array('i')
+	faceGroupList = array.array('i')
+
+	#A new group starts on every object, group or material statement. Groups with the same object/group name and material are merged.
+	groupMap = {}
+	groupName = None
+	materialName = None
+	group = 0
+	groupMap[(groupName, materialName)] = group
 
 	f = open(filename, "r")
 	for line in f:
@@ -17,25 +35,59 @@ def loadScene(filename):
 		if len(parts) < 1:
 			continue
 		if parts[0] == 'v':
-			vertexList.append([float(parts[1]), float(parts[2]), float(parts[3])])
-		if parts[0] == 'f':
-			parts = map(lambda p: p.split('/')[0], parts)
-			for idx in xrange(1, len(parts)-2):
-				faceList.append([int(parts[1]), int(parts[idx+1]), int(parts[idx+2])])
+			v = parts[1:4]
+			if len(v) < 3:
+				v += ['0'] * (3 - len(v))
+			vertexList.extend(map(float, v))
+		elif parts[0] == 'f':
+			if len(parts) < 4:
+				continue
+			indexList.extend(map(lambda p: int(p.split('/')[0]), parts[1:]))
+			faceSizeList.append(len(parts) - 1)
+			faceBaseList.append(len(vertexList) / 3)
+			faceGroupList.append(group)
+		elif parts[0] in ('o', 'g', 'usemtl'):
+			if parts[0] == 'usemtl':
+				materialName = ' '.join(parts[1:])
+			else:
+				groupName = ' '.join(parts[1:])
+			if (groupName, materialName) not in groupMap:
+				groupMap[(groupName, materialName)] = len(groupMap)
+			group = groupMap[(groupName, materialName)]
 	f.close()
 
-	m._prepareFaceCount(len(faceList))
-	for f in faceList:
-		i = f[0] - 1
-		j = f[1] - 1
-		k = f[2] - 1
-		if i < 0 or i >= len(vertexList):
-			i = 0
-		if j < 0 or j >= len(vertexList):
-			j = 0
-		if k < 0 or k >= len(vertexList):
-			k = 0
-		m._addFace(vertexList[i][0], vertexList[i][1], vertexList[i][2], vertexList[j][0], vertexList[j][1], vertexList[j][2], vertexList[k][0], vertexList[k][1], vertexList[k][2])
+	vertexes = numpy.frombuffer(vertexList, numpy.float32).reshape((len(vertexList) / 3, 3))
+	indexes = numpy.frombuffer(indexList, numpy.int32)
+	faceSizes = numpy.frombuffer(faceSizeList, numpy.int32)
+	faceBases = numpy.frombuffer(faceBaseList, numpy.int32)
+	faceGroups = numpy.frombuffer(faceGroupList, numpy.int32)
+
+	#Resolve the 1 based and relative (negative) indexes into 0 based indexes. Invalid indexes point to the first vertex.
+	indexes = numpy.where(indexes < 0, indexes + numpy.repeat(faceBases, faceSizes), indexes - 1)
+	indexes[(indexes < 0) | (indexes >= len(vertexes))] = 0
+
+	#Triangulate all faces as fans: face [a, b, c, d, ...] becomes [a, b, c], [a, c, d], ...
+	faceStarts = numpy.cumsum(faceSizes) - faceSizes
+	triangleCounts = faceSizes - 2
+	triangleFaces = numpy.repeat(numpy.arange(len(faceSizes)), triangleCounts)
+	triangleStarts = faceStarts[triangleFaces]
+	fanOffsets = numpy.arange(len(triangleFaces)) - numpy.repeat(numpy.cumsum(triangleCounts) - triangleCounts, triangleCounts) + 1
+	triangles = numpy.zeros((len(triangleFaces), 3), numpy.int32)
+	if len(indexes) > 0:
+		triangles[:,0] = indexes[triangleStarts]
+		triangles[:,1] = indexes[triangleStarts + fanOffsets]
+		triangles[:,2] = indexes[triangleStarts + fanOffsets + 1]
+
+	triangleGroups = faceGroups[triangleFaces]
+	groupList = numpy.unique(triangleGroups)
+	if len(groupList) > _maxMeshCount or len(groupList) < 1:
+		groupList = [0]
+		triangleGroups = numpy.zeros(len(triangleGroups), numpy.int32)
+	for group in groupList:
+		m = obj._addMesh()
+		groupTriangles = triangles[triangleGroups == group]
+		m.vertexes = vertexes[groupTriangles.reshape(len(groupTriangles) * 3)]
+		m.vertexCount = len(m.vertexes)
 
 	obj._postProcessAfterLoad()
 	return [obj]
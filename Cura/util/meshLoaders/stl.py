@@ -5,36 +5,65 @@ import sys
 import os
 import struct
 import time
+import re
+
+import numpy
 
 from Cura.util import mesh
 
+#Binary STL face record: normal, 3 vertexes and a 2 byte attribute count. 50 bytes per face, without padding.
+_faceRecordType = numpy.dtype([('normal', '<f4', (3,)), ('vertexes', '<f4', (3, 3)), ('attribute', '<u2')])
+#ASCII STL files are read in blocks of this size, so huge ASCII exports never need to fit in memory as a whole.
+_asciiBlockSize = 16 * 1024 * 1024
+_asciiVertexRegex = re.compile('vertex(.*)')
+#Amount of faces written to a stream per write call when saving a binary STL.
+_writeChunkSize = 64 * 1024
+
 def _loadAscii(m, f):
+	#Read the file in large blocks, and parse all vertex lines of a block with a single numpy call.
+	# The vertex buffer is grown geometrically, so we only need a single pass over the file.
+	vertexes = numpy.zeros((3 * 1024, 3), numpy.float32)
 	cnt = 0
-	for lines in f:
-		for line in lines.split('\r'):
-			if 'vertex' in line:
-				cnt += 1
-	m._prepareFaceCount(int(cnt) / 3)
-	f.seek(5, os.SEEK_SET)
-	cnt = 0
-	data = [None,None,None]
-	for lines in f:
-		for line in lines.split('\r'):
-			if 'vertex' in line:
-				data[cnt] = line.split()[1:]
-				cnt += 1
-				if cnt == 3:
-					m._addFace(float(data[0][0]), float(data[0][1]), float(data[0][2]), float(data[1][0]), float(data[1][1]), float(data[1][2]), float(data[2][0]), float(data[2][1]), float(data[2][2]))
-					cnt = 0
+	rest = ''
+	while True:
+		data = f.read(_asciiBlockSize)
+		if len(data) < 1:
+			values = _parseAsciiVertexes(rest)
+		else:
+			data = rest + data
+			end = max(data.rfind('\n'), data.rfind('\r')) + 1
+			rest = data[end:]
+			values = _parseAsciiVertexes(data[:end])
+		if cnt + len(values) > len(vertexes):
+			vertexes.resize((max(len(vertexes) * 2, cnt + len(values)), 3), refcheck=False)
+		vertexes[cnt:cnt + len(values)] = values
+		cnt += len(values)
+		if len(data) < 1:
+			break
+	cnt -= cnt % 3
+	vertexes.resize((cnt, 3), refcheck=False)
+	m.vertexes = vertexes
+	m.vertexCount = cnt
+
+def _parseAsciiVertexes(data):
+	#Some exporters only use \r as line ending, the regular expression only stops at \n.
+	if '\r' in data:
+		data = data.replace('\r', '\n')
+	values = numpy.fromstring(' '.join(_asciiVertexRegex.findall(data)), numpy.float32, sep=' ')
+	return values[:len(values) - len(values) % 3].reshape((len(values) / 3, 3))
 
 def _loadBinary(m, f):
 	#Skip the header
 	f.read(80-5)
 	faceCount = struct.unpack('<I', f.read(4))[0]
-	m._prepareFaceCount(faceCount)
-	for idx in xrange(0, faceCount):
-		data = struct.unpack("<ffffffffffffH", f.read(50))
-		m._addFace(data[3], data[4], data[5], data[6], data[7], data[8], data[9], data[10], data[11])
+	#Never trust the face count in the header further then the actual file size, truncated files are quite common.
+	dataSize = os.fstat(f.fileno()).st_size - f.tell()
+	faceCount = min(faceCount, max(0, dataSize) / _faceRecordType.itemsize)
+	#Read the whole face block in one go, straight into the record array.
+	data = numpy.fromfile(f, _faceRecordType, faceCount)
+	faceCount = len(data)
+	m.vertexes = numpy.array(data['vertexes'], numpy.float32).reshape((faceCount * 3, 3))
+	m.vertexCount = faceCount * 3
 
 def loadScene(filename):
 	obj = mesh.printableObject(filename)
@@ -70,13 +99,14 @@ def saveSceneStream(stream, objects):
 	stream.write(struct.pack("<I", int(vertexCount / 3)))
 	for obj in objects:
 		for m in obj._meshList:
-			vertexes = m.getTransformedVertexes(True)
-			for idx in xrange(0, m.vertexCount, 3):
-				v1 = vertexes[idx]
-				v2 = vertexes[idx+1]
-				v3 = vertexes[idx+2]
-				stream.write(struct.pack("<fff", 0.0, 0.0, 0.0))
-				stream.write(struct.pack("<fff", v1[0], v1[1], v1[2]))
-				stream.write(struct.pack("<fff", v2[0], v2[1], v2[2]))
-				stream.write(struct.pack("<fff", v3[0], v3[1], v3[2]))
-				stream.write(struct.pack("<H", 0))
+			data = numpy.zeros(m.vertexCount / 3, _faceRecordType)
+			#The vertex array can have room for more vertexes than vertexCount, only the used part is written.
+			tris = m.getTransformedVertexes(True)[0:m.vertexCount].reshape((m.vertexCount / 3, 3, 3))
+			data['vertexes'] = tris
+			normals = numpy.cross(tris[::,1] - tris[::,0], tris[::,2] - tris[::,0])
+			lens = numpy.sqrt(normals[:,0]**2 + normals[:,1]**2 + normals[:,2]**2)
+			lens[lens == 0] = 1.0
+			data['normal'] = normals / lens.reshape((len(lens), 1))
+			#Write in large chunks, so we do not need a second full copy of the data as a string.
+			for idx in xrange(0, len(data), _writeChunkSize):
+				stream.write(data[idx:idx + _writeChunkSize].tostring())
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+import threading
+import traceback
+import Queue
+
+import numpy
+
+from Cura.util import mesh
+
+#Levels of detail (LODs) are simplified versions of a mesh, which are drawn instead of the full mesh when the mesh is small on the screen.
+# The LODs are build with vertex clustering: all welded vertexes in the same grid cell are merged into a single vertex,
+# and faces that collapse into a line or point are removed. This is fast and only used for display, the slicer always gets the full mesh.
+# Building happens in a background thread, the result is cached on the mesh until its vertexes change.
+
+#Meshes with less faces are always drawn at full resolution.
+_minimalFaceCount = 100000
+#The amount of grid cells over the largest size of the mesh for each level of detail, most detailed first.
+_lodResolutions = [512, 256, 128, 64]
+
+_queue = Queue.Queue()
+_queueLock = threading.Lock()
+_queuedMeshes = []
+_thread = None
+
+def needsLods(m):
+	return m.vertexCount / 3 >= _minimalFaceCount
+
+#requestLods queues the mesh for building its levels of detail in the background. The callback is called from the worker thread when done.
+def requestLods(m, callback):
+	global _thread
+	if not needsLods(m) or m.getLodList() is not None:
+		return
+	_queueLock.acquire()
+	try:
+		if m in _queuedMeshes:
+			return
+		_queuedMeshes.append(m)
+		_queue.put((m, callback))
+		if _thread is None:
+			_thread = threading.Thread(target=_worker)
+			_thread.daemon = True
+			_thread.start()
+	finally:
+		_queueLock.release()
+
+def _worker():
+	while True:
+		m, callback = _queue.get()
+		vertexes = m.vertexes
+		try:
+			lodList = buildLods(m)
+		except:
+			traceback.print_exc()
+			lodList = []
+		_queueLock.acquire()
+		_queuedMeshes.remove(m)
+		_queueLock.release()
+		#The mesh could be modified while we where busy, in that case these LODs are useless.
+		if m.vertexes is vertexes:
+			m._lodList = (vertexes, lodList)
+			callback()
+
+#buildLods returns a list of (vertexes, normals) triangle soups for a mesh, most detailed first.
+def buildLods(m):
+	vertexes, faces = m.getIndexedMesh()
+	if len(vertexes) < 1:
+		return []
+	size = numpy.max(vertexes.max(0) - vertexes.min(0))
+	lodList = []
+	faceCount = len(faces)
+	for resolution in _lodResolutions:
+		lodVertexes, lodFaces = clusterVertexes(vertexes, faces, size / resolution)
+		#Skip levels that hardly remove any faces, the previous level is good enough.
+		if len(lodFaces) > faceCount * 0.7:
+			continue
+		if len(lodFaces) < 1:
+			break
+		faceCount = len(lodFaces)
+		lodList.append(_triangleSoup(lodVertexes, lodFaces))
+	return lodList
+
+#clusterVertexes merges all vertexes that are in the same cell of a grid into their average, and returns the new vertexes and the faces that are left.
+def clusterVertexes(vertexes, faces, cellSize):
+	cellVertexes, cellIndexes = mesh.weldVertexes(vertexes, cellSize)
+	counts = numpy.bincount(cellIndexes, minlength=len(cellVertexes)).astype(numpy.float64)
+	newVertexes = numpy.zeros((len(cellVertexes), 3), numpy.float32)
+	for n in xrange(0, 3):
+		newVertexes[:,n] = numpy.bincount(cellIndexes, vertexes[:,n], len(cellVertexes)) / counts
+	newFaces = cellIndexes[faces]
+	keep = (newFaces[:,0] != newFaces[:,1]) & (newFaces[:,1] != newFaces[:,2]) & (newFaces[:,2] != newFaces[:,0])
+	return newVertexes, newFaces[keep]
+
+def _triangleSoup(vertexes, faces):
+	tris = vertexes[faces]
+	normals = numpy.cross(tris[:,1] - tris[:,0], tris[:,2] - tris[:,0])
+	lens = numpy.sqrt(numpy.sum(normals * normals, 1))
+	lens[lens == 0] = 1.0
+	normals /= lens.reshape((len(lens), 1))
+	normals = numpy.repeat(normals, 3, 0)
+	return tris.reshape((len(faces) * 3, 3)), normals
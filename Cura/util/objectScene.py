@@ -1,99 +1,226 @@
 __copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
 import random
+import math
+import heapq
 import numpy
 from Cura.util import profile
+from Cura.util import convexHull
 
-class _objectOrder(object):
-	def __init__(self, order, todo):
-		self.order = order
-		self.todo = todo
+#Size of the cells of the footprint index grid, in mm.
+_indexCellSize = 20.0
+#Maximal amount of iterations pushFree uses to push all objects apart.
+_pushFreeIterations = 200
+#pushFree stops early when the amount of hitting pairs has not gone down for this amount of iterations.
+_pushFreeStallIterations = 20
+#Distance in mm objects are pushed further apart than needed, so pushed objects do not end up touching.
+_pushFreeMargin = 0.1
+#Pushed objects are moved this many times the shortest move that separates them. Overshooting the move lets a crowd of objects
+# settle in a lot less iterations, as every push also makes room for the pushes of the neighbours.
+_pushFreeOverRelaxation = 2.0
+#The directions, in object sizes, of the positions next to an object that are tried when looking for a free position.
+_freePositionDirections = numpy.array([(1, 1), (0, 1), (-1, 1), (1, 0), (-1, 0), (1, -1), (0, -1), (-1, -1)], numpy.float64)
+#Amount of positions checked at once when looking for a free position.
+_freePositionChunkSize = 64
 
+#The object order finder finds the order to print objects one at a time in, so the head never hits an object that is already printed.
+# If printing object a would hit object b, a needs to be printed before b. These precedences form a graph, and every order that
+# follows all precedences is a topological sort of this graph. If the graph has a cycle no order is possible and the order is None.
+# Between objects that are free to go in any order, the one hitting the least objects goes last.
 class _objectOrderFinder(object):
 	def __init__(self, scene, offset, leftToRight, frontToBack, gantryHeight):
-		self._scene = scene
 		self._offset = offset - numpy.array([0.1,0.1])
-		self._objs = scene.objects()
 		self._leftToRight = leftToRight
 		self._frontToBack = frontToBack
+		objs = scene.objects()
 		initialList = []
-		for n in xrange(0, len(self._objs)):
-			if scene.checkPlatform(self._objs[n]):
+		for n in xrange(0, len(objs)):
+			if scene.checkPlatform(objs[n]):
 				initialList.append(n)
 		for n in initialList:
-			if self._objs[n].getSize()[2] > gantryHeight and len(initialList) > 1:
+			if objs[n].getSize()[2] > gantryHeight and len(initialList) > 1:
 				self.order = None
 				return
 		if len(initialList) == 0:
 			self.order = []
 			return
 
+		hitMap = self._hitMap(map(lambda n: objs[n], initialList))
+		score = hitMap.sum(1)
+		#Rank of each object in the order the objects are preferred in, the highest rank is printed first when it is free to go.
+		rank = numpy.zeros(len(initialList), int)
+		rank[numpy.argsort(score, kind='mergesort')] = numpy.arange(len(initialList))
 
-		self._hitMap = [None] * (max(initialList)+1)
-		for a in initialList:
-			self._hitMap[a] = [False] * (max(initialList)+1)
-			for b in initialList:
-				self._hitMap[a][b] = self._checkHit(a, b)
-
-		initialList.sort(self._objIdxCmp)
-
-		n = 0
-		self._todo = [_objectOrder([], initialList)]
-		while len(self._todo) > 0:
-			n += 1
-			current = self._todo.pop()
-			#print len(self._todo), len(current.order), len(initialList), current.order
-			for addIdx in current.todo:
-				if not self._checkHitFor(addIdx, current.order) and not self._checkBlocks(addIdx, current.todo):
-					todoList = current.todo[:]
-					todoList.remove(addIdx)
-					order = current.order[:] + [addIdx]
-					if len(todoList) == 0:
-						self._todo = None
-						self.order = order
-						return
-					self._todo.append(_objectOrder(order, todoList))
-		self.order = None
-
-	def _objIdxCmp(self, a, b):
-		scoreA = sum(self._hitMap[a])
-		scoreB = sum(self._hitMap[b])
-		return scoreA - scoreB
-
-	def _checkHitFor(self, addIdx, others):
-		for idx in others:
-			if self._hitMap[addIdx][idx]:
-				return True
-		return False
-
-	def _checkBlocks(self, addIdx, others):
-		for idx in others:
-			if addIdx != idx and self._hitMap[idx][addIdx]:
-				return True
-		return False
-
-	#Check if printing one object will cause printhead colission with other object.
-	def _checkHit(self, addIdx, idx):
-		addPos = self._scene._objectList[addIdx].getPosition()
-		addSize = self._scene._objectList[addIdx].getSize()
-		pos = self._scene._objectList[idx].getPosition()
-		size = self._scene._objectList[idx].getSize()
-
-		if self._leftToRight:
-			if addPos[0] - addSize[0] / 2 - self._offset[0] >= pos[0] + size[0] / 2:
-				return False
-		else:
-			if addPos[0] + addSize[0] / 2 + self._offset[0] <= pos[0] - size[0] / 2:
-				return False
+		#Kahn's algorithm: print the objects that no other unprinted object needs to be printed before.
+		waitCount = hitMap.sum(0)
+		free = []
+		for n in numpy.nonzero(waitCount == 0)[0]:
+			heapq.heappush(free, (-rank[n], n))
+		order = []
+		while len(free) > 0:
+			n = heapq.heappop(free)[1]
+			order.append(initialList[n])
+			for m in numpy.nonzero(hitMap[n])[0]:
+				waitCount[m] -= 1
+				if waitCount[m] == 0:
+					heapq.heappush(free, (-rank[m], m))
+		#Objects left waiting are part of a cycle, or wait on one.
+		if len(order) < len(initialList):
+			self.order = None
+			return
+		self.order = order
 
-		if self._frontToBack:
-			if addPos[1] - addSize[1] / 2 - self._offset[1] >= pos[1] + size[1] / 2:
-				return False
-		else:
-			if addPos[1] + addSize[1] / 2 + self._offset[1] <= pos[1] - size[1] / 2:
-				return False
+	#The hit map tells for every pair of objects if printing the first one will cause a printhead collision with the second one.
+	def _hitMap(self, objList):
+		pos = numpy.array(map(lambda obj: obj.getPosition()[0:2], objList), numpy.float64)
+		size = numpy.array(map(lambda obj: obj.getSize()[0:2], objList), numpy.float64)
+		hitMap = numpy.ones((len(objList), len(objList)), bool)
+		for axis, positiveDirection in [(0, self._leftToRight), (1, self._frontToBack)]:
+			addPos = pos[:,axis].reshape((len(objList), 1))
+			addSize = size[:,axis].reshape((len(objList), 1))
+			if positiveDirection:
+				hitMap &= addPos - addSize / 2 - self._offset[axis] < pos[:,axis] + size[:,axis] / 2
+			else:
+				hitMap &= addPos + addSize / 2 + self._offset[axis] > pos[:,axis] - size[:,axis] / 2
+		numpy.fill_diagonal(hitMap, False)
+		return hitMap
+
+#The MaxRects bin packer places boxes in a rectangle. It keeps the list of maximal free rectangles: the largest rectangles that do not
+# overlap anything placed so far, these can overlap each other. Every box goes in the free rectangle it fits best: the one that leaves
+# the smallest gap on its shortest side (best short side fit), at the lower left corner. Gaps left between large boxes stay free rectangles,
+# so small boxes packed later fill them. Obstacles are areas where no box can be placed, these are taken out of the free rectangles at the start.
+class _maxRectsPacker(object):
+	def __init__(self, width, depth, obstacles):
+		self._width = width
+		self._depth = depth
+		self._obstacles = obstacles
+		self._free = numpy.array([(0.0, 0.0, width, depth)], numpy.float64)
+		self._boxes = []
+		for obstacle in obstacles:
+			self._splitFree(obstacle)
 
+	#Insert a box of w by h, returns the (x, y) of its lower left corner or None when it does not fit.
+	def insert(self, w, h):
+		free = self._free
+		gapW = free[:,2] - free[:,0] - w
+		gapH = free[:,3] - free[:,1] - h
+		fits = numpy.nonzero((gapW >= 0) & (gapH >= 0))[0]
+		if len(fits) < 1:
+			return None
+		gapW = gapW[fits]
+		gapH = gapH[fits]
+		best = fits[numpy.lexsort((free[fits,0], free[fits,1], numpy.maximum(gapW, gapH), numpy.minimum(gapW, gapH)))[0]]
+		x, y = free[best,0], free[best,1]
+		self._boxes.append((x, y, x + w, y + h))
+		self._splitFree(self._boxes[-1])
+		return x, y
+
+	#Remove the box from the free rectangles. Every free rectangle that overlaps the box is replaced by the parts of it on the 4 sides
+	# of the box, and new rectangles that are inside another free rectangle are dropped.
+	def _splitFree(self, box):
+		x0, y0, x1, y1 = box
+		free = self._free
+		hit = (free[:,0] < x1) & (free[:,2] > x0) & (free[:,1] < y1) & (free[:,3] > y0)
+		if not numpy.any(hit):
+			return
+		keep = free[~hit]
+		split = free[hit]
+		new = numpy.concatenate((split, split, split, split))
+		count = len(split)
+		new[0:count,2] = x0
+		new[count:count*2,0] = x1
+		new[count*2:count*3,3] = y0
+		new[count*3:,1] = y1
+		new = new[(new[:,2] > new[:,0]) & (new[:,3] > new[:,1])]
+		#The kept rectangles were not inside each other before, and every new rectangle is part of an old one, so the kept rectangles
+		# can not be inside a new one. Only the new rectangles need to be checked, equal new rectangles keep the first.
+		others = numpy.concatenate((keep, new))
+		inside = (new[:,0:1] >= others[:,0]) & (new[:,1:2] >= others[:,1]) & (new[:,2:3] <= others[:,2]) & (new[:,3:4] <= others[:,3])
+		inside[numpy.arange(len(new)), len(keep) + numpy.arange(len(new))] = False
+		equal = numpy.all(new.reshape((len(new), 1, 4)) == others.reshape((1, len(others), 4)), 2)
+		inside &= ~equal | (numpy.arange(len(others)) < len(keep) + numpy.arange(len(new)).reshape((len(new), 1)))
+		self._free = numpy.concatenate((keep, new[~numpy.any(inside, 1)]))
+
+	def getBoxes(self):
+		return self._boxes
+
+	#Return the (min, max) corners of the area covered by the placed boxes.
+	def getPackedArea(self):
+		boxes = numpy.array(self._boxes, numpy.float64)
+		return boxes[:,0:2].min(0), boxes[:,2:4].max(0)
+
+	#Check if all placed boxes can be moved by the offset, without leaving the packing area or overlapping an obstacle.
+	def canMove(self, offset):
+		boxes = numpy.array(self._boxes, numpy.float64) + numpy.concatenate((offset, offset))
+		if numpy.any(boxes[:,0:2] < 0) or numpy.any(boxes[:,2] > self._width) or numpy.any(boxes[:,3] > self._depth):
+			return False
+		for x0, y0, x1, y1 in self._obstacles:
+			if numpy.any((boxes[:,0] < x1) & (boxes[:,2] > x0) & (boxes[:,1] < y1) & (boxes[:,3] > y0)):
+				return False
 		return True
 
+#The offset, in plates, of the extra plate with the given index (1 and up) from the platform. The extra plates are placed in rings
+# around the platform, every ring starting with the plates closest to the platform.
+def _extraPlateOffset(plateIdx):
+	ring = 1
+	while (ring * 2 + 1) ** 2 <= plateIdx:
+		ring += 1
+	offsets = [(x, y) for x in xrange(-ring, ring + 1) for y in xrange(-ring, ring + 1) if max(abs(x), abs(y)) == ring]
+	offsets.sort(key=lambda offset: (offset[0] * offset[0] + offset[1] * offset[1], -offset[0], -offset[1]))
+	return numpy.array(offsets[plateIdx - (ring * 2 - 1) ** 2], numpy.float64)
+
+def _polygonArea(points):
+	if len(points) < 3:
+		return 0.0
+	x = points[:,0]
+	y = points[:,1]
+	return abs(numpy.dot(x, numpy.roll(y, -1)) - numpy.dot(y, numpy.roll(x, -1))) / 2
+
+class _footprintIndex(object):
+	def __init__(self):
+		self._cells = {}
+		self._entries = {}
+
+	def update(self, obj, stamp, boxMin, boxMax):
+		entry = self._entries.get(obj)
+		if entry is not None:
+			if entry[0] == stamp:
+				return
+			self.remove(obj)
+		cellList = self._cellList(boxMin, boxMax)
+		for cell in cellList:
+			if cell in self._cells:
+				self._cells[cell].append(obj)
+			else:
+				self._cells[cell] = [obj]
+		self._entries[obj] = (stamp, cellList)
+
+	def remove(self, obj):
+		if obj not in self._entries:
+			return
+		for cell in self._entries[obj][1]:
+			self._cells[cell].remove(obj)
+			if len(self._cells[cell]) < 1:
+				del self._cells[cell]
+		del self._entries[obj]
+
+	def objects(self):
+		return self._entries.keys()
+
+	#Return all objects in the cells touched by the box.
+	def query(self, boxMin, boxMax):
+		ret = set()
+		for cell in self._cellList(boxMin, boxMax):
+			if cell in self._cells:
+				ret.update(self._cells[cell])
+		return ret
+
+	def _cellList(self, boxMin, boxMax):
+		x0 = int(math.floor(boxMin[0] / _indexCellSize))
+		y0 = int(math.floor(boxMin[1] / _indexCellSize))
+		x1 = int(math.floor(boxMax[0] / _indexCellSize))
+		y1 = int(math.floor(boxMax[1] / _indexCellSize))
+		return [(x, y) for x in xrange(x0, x1 + 1) for y in xrange(y0, y1 + 1)]
+
 class Scene(object):
 	def __init__(self):
 		self._objectList = []
@@ -104,6 +231,9 @@ class Scene(object):
 		self._leftToRight = False
 		self._frontToBack = True
 		self._gantryHeight = 60
+		self._objectIdx = {}
+		self._printOrderCache = None
+		self._clearFootprints()
 	# Physical (square) machine size.
 	def setMachineSize(self, machineSize):
 		self._machineSize = machineSize
@@ -111,6 +241,7 @@ class Scene(object):
 	# Size offsets are offsets caused by brim, skirt, etc.
 	def setSizeOffsets(self, sizeOffsets):
 		self._sizeOffsets = sizeOffsets
+		self._clearFootprints()
 
 	#size of the printing head.
 	def setHeadSize(self, xMin, xMax, yMin, yMax, gantryHeight):
@@ -119,6 +250,12 @@ class Scene(object):
 		self._headOffsets[0] = min(xMin, xMax)
 		self._headOffsets[1] = min(yMin, yMax)
 		self._gantryHeight = gantryHeight
+		self._clearFootprints()
+
+	#The footprints depend on the size offsets and the head size, so these need to be recalculated when those change.
+	def _clearFootprints(self):
+		self._index = _footprintIndex()
+		self._footprintCache = {}
 
 	def getObjectExtend(self):
 		return self._sizeOffsets + self._headOffsets
@@ -138,6 +275,9 @@ class Scene(object):
 
 	def remove(self, obj):
 		self._objectList.remove(obj)
+		self._index.remove(obj)
+		self._footprintCache.pop(obj, None)
+		self._objectIdx.pop(obj, None)
 
 	#Dual(multiple) extrusion merge
 	def merge(self, obj1, obj2):
@@ -149,19 +289,98 @@ class Scene(object):
 		obj1.setPosition((obj1.getPosition() + obj2.getPosition()) / 2)
 		self.pushFree()
 
+	#Push objects apart until none of them hit each other. Every iteration pushes the hitting pairs apart one after the other, each pair
+	# by the shortest move that separates their footprints, split over both objects. Later pairs see the moves of the earlier ones,
+	# so a pile of objects spreads out instead of being blown apart by the sum of all pushes on an object.
+	# Objects that are on the platform are kept on it. The objects that still hit after the iterations are moved to a free position one at a time.
 	def pushFree(self):
-		n = 1000
-		while self._pushFree():
-			n -= 1
-			if n < 0:
+		objs = self._objectList
+		onPlatform = numpy.array(map(self.checkPlatform, objs), bool).reshape((len(objs),))
+		posMin = numpy.zeros((len(objs), 2), numpy.float64) - numpy.inf
+		posMax = numpy.zeros((len(objs), 2), numpy.float64) + numpy.inf
+		for n in numpy.nonzero(onPlatform)[0]:
+			footprint = objs[n].getFootprint(self._sizeOffsets)
+			posMin[n] = -self._machineSize[0:2] / 2 - footprint.min(0)
+			posMax[n] = self._machineSize[0:2] / 2 - footprint.max(0)
+		bestCount = None
+		for n in xrange(0, _pushFreeIterations):
+			pushCount = self._pushFree(posMin, posMax, onPlatform)
+			if pushCount < 1:
 				return
+			#Objects jammed on a full platform keep pushing each other back, stop when the amount of pushes does not go down anymore.
+			if bestCount is None or pushCount < bestCount:
+				bestCount = pushCount
+				bestIteration = n
+			elif n - bestIteration >= _pushFreeStallIterations:
+				break
+		self._placeHittingObjects()
 
+	#Arrange all objects on the platform with a MaxRects bin packer. Every object is packed as the box around its footprint grown by half
+	# the object extend, so the packed boxes can touch. The largest footprints are placed first, the smaller ones fill the gaps between them.
+	# If not all objects fit on the platform, packing the smallest first is tried as well, and the packing with the most objects on the platform is used.
+	# Objects that do not fit on the platform are packed on extra plates around it, nearest first, so they are not printed but easy to find.
+	# Objects too large for any plate are added like new objects.
 	def arrangeAll(self):
+		extend = self.getObjectExtend() / 2
+		#An object is on the platform when its footprint grown by the size offsets is, so the packing area and the clip zones
+		# are grown by the difference with the extend used for the boxes.
+		margin = extend - self._sizeOffsets
+		size = self._machineSize[0:2] + margin * 2
+		origin = -size / 2
+		obstacles = []
+		for clipMin, clipMax in self._getClipZones():
+			obstacles.append(tuple(numpy.array(clipMin) - margin - origin) + tuple(numpy.array(clipMax) + margin - origin))
+		objList = sorted(self._objectList, key=lambda obj: -_polygonArea(obj.getFootprint()))
+		plates, placed, notPlaced = self._packPlates(objList, extend, size, obstacles)
+		if len(plates) > 1:
+			smallFirst = self._packPlates(objList[::-1], extend, size, obstacles)
+			if len(smallFirst[0][0].getBoxes()) > len(plates[0].getBoxes()):
+				plates, placed, notPlaced = smallFirst
+
+		#Center the objects on the platform, if that does not move them into a clip zone.
+		offset = numpy.zeros(2, numpy.float64)
+		if len(plates[0].getBoxes()) > 0:
+			packedMin, packedMax = plates[0].getPackedArea()
+			center = (size - packedMax - packedMin) / 2
+			for offset in [center, numpy.array([center[0], 0.0]), numpy.zeros(2, numpy.float64)]:
+				if plates[0].canMove(offset):
+					break
+
 		oldList = self._objectList
 		self._objectList = []
-		for obj in oldList:
+		for obj, plateIdx, pos in placed:
+			if plateIdx == 0:
+				obj.setPosition(origin + pos + offset)
+			else:
+				obj.setPosition(origin + pos + size * _extraPlateOffset(plateIdx))
+			self._objectList.append(obj)
+		for obj in notPlaced:
 			obj.setPosition(numpy.array([0,0], numpy.float32))
 			self.add(obj)
+		#Keep the objects in the same order as before.
+		self._objectList = oldList
+
+	#Pack the objects in the given order on plates of the given size, the first plate is the platform. Returns the plates,
+	# a list of (object, plate index, position on the plate) and the list of objects too large for any plate.
+	def _packPlates(self, objList, extend, size, obstacles):
+		plates = [_maxRectsPacker(size[0], size[1], obstacles)]
+		placed = []
+		notPlaced = []
+		for obj in objList:
+			footprint = obj.getFootprint(extend)
+			boxMin = footprint.min(0)
+			boxSize = footprint.max(0) - boxMin
+			if boxSize[0] > size[0] or boxSize[1] > size[1]:
+				notPlaced.append(obj)
+				continue
+			for plateIdx in xrange(0, len(plates) + 1):
+				if plateIdx == len(plates):
+					plates.append(_maxRectsPacker(size[0], size[1], []))
+				pos = plates[plateIdx].insert(boxSize[0], boxSize[1])
+				if pos is not None:
+					break
+			placed.append((obj, plateIdx, numpy.array(pos) - boxMin))
+		return plates, placed, notPlaced
 
 	def centerAll(self):
 		minPos = numpy.array([9999999,9999999], numpy.float32)
@@ -177,104 +396,255 @@ class Scene(object):
 		for obj in self._objectList:
 			obj.setPosition(obj.getPosition() + offset)
 
+	#intersectRay returns the object first hit by the ray from p0 through p1 and the point where it is hit, or None when no object is hit.
+	def intersectRay(self, p0, p1):
+		ret = None
+		for obj in self._objectList:
+			hit = obj.intersectRay(p0, p1)
+			if hit is not None and (ret is None or hit[0] < ret[0]):
+				ret = (hit[0], obj, hit[1])
+		if ret is None:
+			return None
+		return ret[1], ret[2]
+
+	#printOrder returns the list of object indexes to print one at a time in, or None if the objects need to be printed all at once.
+	# The order only depends on the positions and sizes of the objects and the machine, so it is kept until one of those changes.
 	def printOrder(self):
-		order = _objectOrderFinder(self, self._headOffsets + self._sizeOffsets, self._leftToRight, self._frontToBack, self._gantryHeight).order
-		return order
+		key = (profile.getMachineSetting('machine_type'), tuple(self._machineSize), tuple(self._sizeOffsets), tuple(self._headOffsets), self._leftToRight, self._frontToBack, self._gantryHeight)
+		for obj in self._objectList:
+			key += (id(obj), obj._matrixVersion, tuple(obj.getPosition()))
+		if self._printOrderCache is None or self._printOrderCache[0] != key:
+			order = _objectOrderFinder(self, self._headOffsets + self._sizeOffsets, self._leftToRight, self._frontToBack, self._gantryHeight).order
+			self._printOrderCache = (key, order)
+		if self._printOrderCache[1] is None:
+			return None
+		return self._printOrderCache[1][:]
 
-	def _pushFree(self):
-		for a in self._objectList:
-			for b in self._objectList:
-				if not self._checkHit(a, b):
-					continue
-				posDiff = a.getPosition() - b.getPosition()
-				if posDiff[0] == 0.0 and posDiff[1] == 0.0:
-					posDiff[1] = 1.0
-				if abs(posDiff[0]) > abs(posDiff[1]):
-					axis = 0
-				else:
-					axis = 1
-				aPos = a.getPosition()
-				bPos = b.getPosition()
-				center = (aPos[axis] + bPos[axis]) / 2
-				distance = (a.getSize()[axis] + b.getSize()[axis]) / 2 + 0.1 + self._sizeOffsets[axis] + self._headOffsets[axis]
-				if posDiff[axis] < 0:
-					distance = -distance
-				aPos[axis] = center + distance / 2
-				bPos[axis] = center - distance / 2
-				a.setPosition(aPos)
-				b.setPosition(bPos)
-				return True
-		return False
+	#Push all hitting pairs apart once, every object stays between posMin and posMax. When one object of a pair can not move
+	# the full half, the other one moves further. Objects on the platform are pushed out of the clip zones. Returns the amount of pushed pairs.
+	def _pushFree(self, posMin, posMax, onPlatform):
+		objs = self._objectList
+		a, b = self._boxPairs(self._footprintBoxes())
+		extend = self.getObjectExtend() / 2
+		pos = numpy.array(map(lambda obj: obj.getPosition()[0:2], objs), numpy.float64)
+		pushed = numpy.zeros(len(objs), bool)
+		pushCount = 0
+		#Push the pairs closest to the center of all objects first, so a crowd is pushed outwards in a single pass.
+		if len(a) > 0:
+			pairCenter = (pos[a] + pos[b]) / 2 - pos.mean(0)
+			pairOrder = numpy.argsort(numpy.sum(pairCenter * pairCenter, 1), kind='mergesort')
+			a = a[pairOrder]
+			b = b[pairOrder]
+		for i, j in zip(a, b):
+			move = convexHull.polygonSeparation(objs[i].getFootprint(extend) + pos[i], objs[j].getFootprint(extend) + pos[j])
+			if move is None:
+				continue
+			#Push a bit further, so the objects do not end up touching.
+			move *= (1.0 + _pushFreeMargin / numpy.sqrt(numpy.sum(move * move))) * _pushFreeOverRelaxation
+			posI = numpy.minimum(numpy.maximum(pos[i] - move / 2, posMin[i]), posMax[i])
+			posJ = numpy.minimum(numpy.maximum(pos[j] + move + (posI - pos[i]), posMin[j]), posMax[j])
+			pos[i] = numpy.minimum(numpy.maximum(posJ - pos[j] + pos[i] - move, posMin[i]), posMax[i])
+			pos[j] = posJ
+			pushed[i] = True
+			pushed[j] = True
+			pushCount += 1
+		clipZones = self._getClipZones()
+		if len(clipZones) > 0:
+			for n in numpy.nonzero(pushed & onPlatform)[0]:
+				footprint = objs[n].getFootprint(self._sizeOffsets) + pos[n]
+				for clipMin, clipMax in clipZones:
+					if numpy.any(footprint.max(0) <= clipMin) or numpy.any(footprint.min(0) >= clipMax):
+						continue
+					clip = numpy.array([clipMin, (clipMax[0], clipMin[1]), clipMax, (clipMin[0], clipMax[1])], numpy.float64)
+					move = convexHull.polygonSeparation(clip, footprint)
+					if move is None:
+						continue
+					move *= 1.0 + _pushFreeMargin / numpy.sqrt(numpy.sum(move * move))
+					newPos = numpy.minimum(numpy.maximum(pos[n] + move, posMin[n]), posMax[n])
+					footprint += newPos - pos[n]
+					pos[n] = newPos
+		for n in numpy.nonzero(pushed)[0]:
+			objs[n].setPosition(pos[n])
+		return pushCount
+
+	#Move one object of every pair that still hits to the free position closest to where it is, the object that is not on the platform
+	# if there is one. Objects on the platform are only moved to a free position on the platform, when there is none they are left
+	# where they are, as objects moved off the platform are not printed.
+	def _placeHittingObjects(self):
+		objs = self._objectList
+		a, b = self._hittingPairs(self._footprintBoxes())
+		for i, j in zip(a, b):
+			if not self._checkHit(objs[i], objs[j]):
+				continue
+			obj = objs[j]
+			onPlatform = self.checkPlatform(obj)
+			if onPlatform and not self.checkPlatform(objs[i]):
+				obj = objs[i]
+				onPlatform = False
+			self._findFreePositionFor(obj, obj.getPosition(), onPlatform)
+
+	#The boxes (minX, minY, maxX, maxY) around the footprints of all objects.
+	def _footprintBoxes(self):
+		boxes = numpy.zeros((len(self._objectList), 4), numpy.float64)
+		for n in xrange(0, len(self._objectList)):
+			boxMin, boxMax = self._footprintBox(self._objectList[n])
+			boxes[n] = boxMin + boxMax
+		return boxes
+
+	#Find all pairs of objects that hit each other. The pairs with overlapping boxes are checked with the exact footprints.
+	# Returns the object indexes of both sides of the pairs.
+	def _hittingPairs(self, boxes):
+		a, b = self._boxPairs(boxes)
+		hit = numpy.array([self._checkHit(self._objectList[i], self._objectList[j]) for i, j in zip(a, b)], bool)
+		if len(hit) < 1:
+			return a, b
+		return a[hit], b[hit]
+
+	#Find all pairs of overlapping boxes (minX, minY, maxX, maxY) with sweep-and-prune. The boxes are sorted on their minimal X,
+	# so the boxes that can overlap a box in X are the ones after it that start before it ends. The Y overlap of all those pairs is
+	# checked at once. Returns the indexes of both sides of the pairs, sorted on the first and then the second index.
+	def _boxPairs(self, boxes):
+		count = len(boxes)
+		order = numpy.argsort(boxes[:,0], kind='mergesort')
+		ends = numpy.searchsorted(boxes[order,0], boxes[order,2], 'left')
+		pairCounts = numpy.maximum(ends - numpy.arange(count) - 1, 0)
+		first = numpy.repeat(numpy.arange(count), pairCounts)
+		second = first + 1 + numpy.arange(len(first)) - numpy.repeat(numpy.cumsum(pairCounts) - pairCounts, pairCounts)
+		a = numpy.minimum(order[first], order[second])
+		b = numpy.maximum(order[first], order[second])
+		keep = (boxes[a,0] < boxes[b,2]) & (boxes[b,0] < boxes[a,2]) & (boxes[a,1] < boxes[b,3]) & (boxes[b,1] < boxes[a,3])
+		a = a[keep]
+		b = b[keep]
+		pairOrder = numpy.lexsort((b, a))
+		return a[pairOrder], b[pairOrder]
+
+	#The footprint of an object used for collision checks: its convex hull grown by half the object extend, so two objects hit
+	# when they are closer than the extend (the size offsets and the head size) to each other.
+	# Returns the footprint in scene coordinates and its bounding box, cached until the object moves or changes.
+	def _getFootprint(self, obj):
+		pos = obj.getPosition()
+		stamp = (obj._matrixVersion, float(pos[0]), float(pos[1]))
+		entry = self._footprintCache.get(obj)
+		if entry is None or entry[0] != stamp:
+			extend = self.getObjectExtend() / 2
+			footprint = obj.getFootprint(extend)
+			boxMin = footprint.min(0)
+			boxMax = footprint.max(0)
+			entry = (stamp, footprint + pos, (boxMin[0] + stamp[1], boxMin[1] + stamp[2]), (boxMax[0] + stamp[1], boxMax[1] + stamp[2]))
+			self._footprintCache[obj] = entry
+		return entry[1:]
+
+	def _footprintBox(self, obj):
+		return self._getFootprint(obj)[1:]
+
+	#Bring the footprint index up to date with the objects in the scene. Only objects that moved or changed are updated.
+	def _updateIndex(self):
+		self._objectIdx = dict(zip(self._objectList, xrange(0, len(self._objectList))))
+		for obj in self._index.objects():
+			if obj not in self._objectIdx:
+				self._index.remove(obj)
+				self._footprintCache.pop(obj, None)
+		for obj in self._objectList:
+			footprint, boxMin, boxMax = self._getFootprint(obj)
+			self._index.update(obj, self._footprintCache[obj][0], boxMin, boxMax)
 
 	#Check if two objects are hitting each-other (+ head space).
 	def _checkHit(self, a, b):
 		if a == b:
 			return False
-		posDiff = a.getPosition() - b.getPosition()
-		if abs(posDiff[0]) < (a.getSize()[0] + b.getSize()[0]) / 2 + self._sizeOffsets[0] + self._headOffsets[0]:
-			if abs(posDiff[1]) < (a.getSize()[1] + b.getSize()[1]) / 2 + self._sizeOffsets[1] + self._headOffsets[1]:
-				return True
-		return False
+		footprintA, minA, maxA = self._getFootprint(a)
+		footprintB, minB, maxB = self._getFootprint(b)
+		if maxA[0] <= minB[0] or maxA[1] <= minB[1] or maxB[0] <= minA[0] or maxB[1] <= minA[1]:
+			return False
+		return convexHull.polygonsOverlap(footprintA, footprintB)
 
 	def checkPlatform(self, obj):
-		p = obj.getPosition()
-		s = obj.getSize()[0:2] / 2 + self._sizeOffsets
-		if p[0] - s[0] < -self._machineSize[0] / 2:
-			return False
-		if p[0] + s[0] > self._machineSize[0] / 2:
+		footprint = obj.getFootprint(self._sizeOffsets) + obj.getPosition()
+		if numpy.any(footprint.min(0) < -self._machineSize[0:2] / 2):
 			return False
-		if p[1] - s[1] < -self._machineSize[1] / 2:
-			return False
-		if p[1] + s[1] > self._machineSize[1] / 2:
+		if numpy.any(footprint.max(0) > self._machineSize[0:2] / 2):
 			return False
 
-		#Do clip Check for UM2.
-		machine = profile.getMachineSetting('machine_type')
-		if(machine == "ultimaker2"):
-			#lowerRight clip check
-			if p[0] - s[0] < -self._machineSize[0] / 2 + 25 and p[1] - s[1] < -self._machineSize[1]/2 + 10:
-				return False
-			#UpperRight
-			if p[0] - s[0] < -self._machineSize[0] / 2 + 25 and p[1] + s[1] > self._machineSize[1]/2 - 10:
-				return False
-			#LowerLeft
-			if p[0] + s[0] > self._machineSize[0] / 2 - 25 and p[1] - s[1] < -self._machineSize[1]/2 + 10:
-				return False
-			#UpperLeft
-			if p[0] + s[0] > self._machineSize[0] / 2 - 25 and p[1] + s[1] > self._machineSize[1]/2 - 10:
+		for clipMin, clipMax in self._getClipZones():
+			clip = numpy.array([clipMin, (clipMax[0], clipMin[1]), clipMax, (clipMin[0], clipMax[1])], numpy.float64)
+			if convexHull.polygonsOverlap(footprint, clip):
 				return False
 		return True
 
-	def _findFreePositionFor(self, obj):
-		posList = []
-		for a in self._objectList:
-			p = a.getPosition()
-			s = (a.getSize()[0:2] + obj.getSize()[0:2]) / 2 + self._sizeOffsets + self._headOffsets
-			posList.append(p + s * ( 1.0, 1.0))
-			posList.append(p + s * ( 0.0, 1.0))
-			posList.append(p + s * (-1.0, 1.0))
-			posList.append(p + s * ( 1.0, 0.0))
-			posList.append(p + s * (-1.0, 0.0))
-			posList.append(p + s * ( 1.0,-1.0))
-			posList.append(p + s * ( 0.0,-1.0))
-			posList.append(p + s * (-1.0,-1.0))
+	#Areas of the platform where no object can be placed, as (min, max) corners. The UM2 has clips holding the glass plate in the corners.
+	def _getClipZones(self):
+		if profile.getMachineSetting('machine_type') != "ultimaker2":
+			return []
+		w = self._machineSize[0] / 2
+		h = self._machineSize[1] / 2
+		return [((-w, -h), (-w + 25, -h + 10)), ((-w, h - 10), (-w + 25, h)), ((w - 25, -h), (w, -h + 10)), ((w - 25, h - 10), (w, h))]
 
+	#Move the object to the free position next to another object that is closest to near. Positions off the platform count as 3 times further away,
+	# or are not used at all with platformOnly. The object is not moved when no position is found.
+	# The positions are tried closest first, in chunks. The boxes of all positions in a chunk are checked against the boxes of the objects
+	# around the chunk at once, only the positions that overlap a box are checked with the exact footprints.
+	def _findFreePositionFor(self, obj, near = (0.0, 0.0), platformOnly = False):
+		count = len(self._objectList)
+		if count < 1:
+			return
+		pos = numpy.array(map(lambda a: a.getPosition()[0:2], self._objectList), numpy.float64)
+		size = numpy.array(map(lambda a: a.getSize()[0:2], self._objectList), numpy.float64)
+		offsets = (size + obj.getSize()[0:2]) / 2 + self._sizeOffsets + self._headOffsets
+		posList = (pos.reshape((count, 1, 2)) + offsets.reshape((count, 1, 2)) * _freePositionDirections).reshape((count * len(_freePositionDirections), 2))
+		distList = numpy.sqrt(numpy.sum((posList - numpy.array(near, numpy.float64)) ** 2, 1))
+
+		footprint = obj.getFootprint(self.getObjectExtend() / 2)
+		boxMin = footprint.min(0)
+		boxMax = footprint.max(0)
+		platformFootprint = obj.getFootprint(self._sizeOffsets)
+		inBounds = numpy.all(posList + platformFootprint.min(0) >= -self._machineSize[0:2] / 2, 1) & numpy.all(posList + platformFootprint.max(0) <= self._machineSize[0:2] / 2, 1)
+
+		oldPos = obj.getPosition().copy()
 		best = None
 		bestDist = None
-		for p in posList:
-			obj.setPosition(p)
-			ok = True
-			for a in self._objectList:
-				if self._checkHit(a, obj):
-					ok = False
-					break
-			if not ok:
+		self._updateIndex()
+		#Try the closest positions first, once a free position is found the positions further away can not be better.
+		# Positions off the platform can not be better either, as they are further away than the one found already.
+		order = numpy.argsort(distList, kind='mergesort')
+		for start in xrange(0, len(order), _freePositionChunkSize):
+			chunk = order[start:start + _freePositionChunkSize]
+			if best is not None and distList[chunk[0]] >= bestDist:
+				break
+			if best is not None:
+				chunk = chunk[(distList[chunk] < bestDist) & inBounds[chunk]]
+			elif platformOnly:
+				chunk = chunk[inBounds[chunk]]
+			if len(chunk) < 1:
 				continue
-			dist = numpy.linalg.norm(p)
-			if not self.checkPlatform(obj):
-				dist *= 3
-			if best is None or dist < bestDist:
-				best = p
-				bestDist = dist
-		if best is not None:
-			obj.setPosition(best)
+			chunkMin = posList[chunk] + boxMin
+			chunkMax = posList[chunk] + boxMax
+			candidates = self._index.query(chunkMin.min(0), chunkMax.max(0))
+			candidates.discard(obj)
+			candidates = sorted(candidates, key=self._objectIdx.get)
+			boxes = numpy.array(map(lambda a: sum(self._footprintBox(a), ()), candidates), numpy.float64).reshape((len(candidates), 4))
+			overlap = (chunkMin[:,0:1] < boxes[:,2]) & (boxes[:,0] < chunkMax[:,0:1]) & (chunkMin[:,1:2] < boxes[:,3]) & (boxes[:,1] < chunkMax[:,1:2])
+			for k in xrange(0, len(chunk)):
+				n = chunk[k]
+				dist = distList[n]
+				if best is not None and dist >= bestDist:
+					break
+				if best is not None and not inBounds[n]:
+					continue
+				obj.setPosition(posList[n].copy())
+				ok = True
+				for m in numpy.nonzero(overlap[k])[0]:
+					if self._checkHit(candidates[m], obj):
+						ok = False
+						break
+				if not ok:
+					continue
+				if not inBounds[n] or not self.checkPlatform(obj):
+					if platformOnly:
+						continue
+					dist *= 3
+				if best is None or dist < bestDist:
+					best = posList[n].copy()
+					bestDist = dist
+		if best is None:
+			best = oldPos
+		obj.setPosition(best)
@@ -221,6 +221,7 @@ setting('raft_interface_linewidth', 0.2, float, 'expert', _('Raft')).setRange(0)
 setting('fix_horrible_union_all_type_a', False, bool, 'expert', _('Fix horrible')).setLabel(_("Combine everything (Type-A)"), _("This expert option adds all parts of the model together. The result is usually that internal cavities disappear. Depending on the model this can be intended or not. Enabling this option is at your own risk. Type-A is depended on the model normals and tries to keep some internal holes intact. Type-B ignores all internal holes and only keeps the outside shape per layer."))
 setting('fix_horrible_union_all_type_b', False, bool, 'expert', _('Fix horrible')).setLabel(_("Combine everything (Type-B)"), _("This expert option adds all parts of the model together. The result is usually that internal cavities disappear. Depending on the model this can be intended or not. Enabling this option is at your own risk. Type-A is depended on the model normals and tries to keep some internal holes intact. Type-B ignores all internal holes and only keeps the outside shape per layer."))
 setting('fix_horrible_use_open_bits', False, bool, 'expert', _('Fix horrible')).setLabel(_("Keep open faces"), _("This expert option keeps all the open bits of the model intact. Normally Cura tries to stitch up small holes and remove everything with big holes, but this option keeps bits that are not properly part of anything and just goes with whatever it is left. This option is usually not what you want, but it might enable you to slice models otherwise failing to produce proper paths.\nAs with all \"Fix horrible\" options, results may vary and use at your own risk."))
+setting('fix_horrible_repair_mesh', False, bool, 'expert', _('Fix horrible')).setLabel(_("Repair mesh"), _("Before slicing, remove faces without area and duplicate faces, fix faces that are inside out and close simple holes in the model.\nAs with all \"Fix horrible\" options, results may vary and use at your own risk."))
 setting('fix_horrible_extensive_stitching', False, bool, 'expert', _('Fix horrible')).setLabel(_("Extensive stitching"), _("Extrensive stitching tries to fix up open holes in the model by closing the hole with touching polygons. This algorthm is quite expensive and could introduce a lot of processing time.\nAs with all \"Fix horrible\" options, results may vary and use at your own risk."))
 
 setting('plugin_config', '', str, 'hidden', 'hidden')
@@ -339,6 +340,8 @@ setting('youmagine_token', '', str, 'preference', 'hidden')
 setting('filament_physical_density', '1240', float, 'preference', 'hidden').setRange(500.0, 3000.0).setLabel(_("Density (kg/m3)"), _("Weight of the filament per m3. Around 1240 for PLA. And around 1040 for ABS. This value is used to estimate the weight if the filament used for the print."))
 setting('language', 'English', str, 'preference', 'hidden').setLabel(_('Language'), _('Change the language in which Cura runs. Switching language requires a restart of Cura'))
 setting('active_machine', '0', int, 'preference', 'hidden')
+setting('mesh_cache_size', '512', float, 'preference', 'hidden').setRange(0).setLabel(_("Model cache size (MB)"), _("Amount of disk space used to cache loaded models, so opening the same model again is faster. Set to 0 to disable the cache."))
+setting('gcode_cache_size', '256', float, 'preference', 'hidden').setRange(0).setLabel(_("GCode cache size (MB)"), _("Amount of disk space used to cache sliced results, so slicing the same models with the same settings again is instant. Set to 0 to disable the cache."))
 
 setting('model_colour', '#FFC924', str, 'preference', 'hidden').setLabel(_('Model colour'))
 setting('model_colour2', '#CB3030', str, 'preference', 'hidden').setLabel(_('Model colour (2)'))
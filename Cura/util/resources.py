@@ -5,8 +5,6 @@ import os
 import sys
 import glob
 
-#Cura/util classes should not depend on wx...
-import wx
 import gettext
 
 if sys.platform.startswith('darwin'):
@@ -54,7 +52,9 @@ def setupLocalization(selectedLanguage = None):
 		if sys.platform.startswith('darwin'):
 			languages = NSLocale.preferredLanguages()
 		else:
+			#Cura/util classes should not depend on wx, so it is only imported here. Without wx the language defaults to 'en'.
 			#Using wx.Locale before you created wx.App seems to cause an nasty exception. So default to 'en' at the moment.
+			import wx
 			languages = [wx.Locale(wx.LANGUAGE_DEFAULT).GetCanonicalName()]
 	except Exception as e:
 		languages = ['en']
@@ -0,0 +1,193 @@
+from __future__ import absolute_import
+__copyright__ = "Copyright (C) 2013 David Braam - Released under terms of the AGPLv3 License"
+
+#The scene benchmark times the layout operations of the Scene (add, pushFree, arrangeAll, centerAll, printOrder and checkPlatform)
+# on synthetic plates of box shaped objects with mixed sizes and rotations, and layFlat on dense curved meshes. It does not need wx or OpenGL.
+# Every result is printed as a single line of JSON, so runs can be compared by scripts. Run it with:
+#   python -m Cura.util.sceneBenchmark --count 10,100,1000
+# It also checks that arrangeAll puts at least as many small objects on the platform as adding them one by one does,
+# and exits with an error when it does not.
+
+import sys
+import time
+import math
+import json
+import random
+from optparse import OptionParser
+
+import numpy
+
+from Cura.util import profile
+from Cura.util import mesh
+from Cura.util import objectScene
+
+#The corners and faces of a unit box, centered on X and Y and standing on Z=0.
+_boxCorners = numpy.array([(x, y, z) for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (0.0, 1.0)], numpy.float32)
+_boxFaces = [(0,2,6),(0,6,4),(1,5,7),(1,7,3),(0,4,5),(0,5,1),(2,3,7),(2,7,6),(0,1,3),(0,3,2),(4,6,7),(4,7,5)]
+
+#The machines the plates are benchmarked on: the size of the machine and the head size (xMin, xMax, yMin, yMax, gantryHeight).
+_machines = {
+	'ultimaker': ((205, 205, 200), (75, 18, 18, 35, 55)),
+	'ultimaker2': ((230, 225, 205), (40, 60, 10, 30, 55)),
+}
+
+#makeObject returns a printableObject with a box mesh of the given size, rotated around Z by the given angle in degrees.
+def makeObject(size, angle):
+	obj = mesh.printableObject(None)
+	m = obj._addMesh()
+	m.vertexes = (_boxCorners * numpy.array(size, numpy.float32))[numpy.array(_boxFaces).reshape(36)]
+	m.vertexCount = 36
+	obj._postProcessAfterLoad()
+	a = math.radians(angle)
+	obj.applyMatrix(numpy.matrix([[math.cos(a),math.sin(a),0],[-math.sin(a),math.cos(a),0],[0,0,1]], numpy.float64))
+	return obj
+
+#makeDenseObject returns a printableObject with a sphere mesh of about faceCount faces and a diameter of 60mm, cut flat at a quarter
+# of its height, rotated by the given matrix. The flat cut is the side layFlat should put it on.
+def makeDenseObject(faceCount, matrix):
+	rings = max(3, int(math.sqrt(faceCount / 4.0)))
+	segments = rings * 2
+	a = numpy.arange(0, rings + 1) * math.pi / rings
+	b = numpy.arange(0, segments + 1) * 2.0 * math.pi / segments
+	points = numpy.zeros((rings + 1, segments + 1, 3), numpy.float32)
+	points[:,:,0] = numpy.outer(numpy.sin(a), numpy.cos(b)) * 30.0
+	points[:,:,1] = numpy.outer(numpy.sin(a), numpy.sin(b)) * 30.0
+	points[:,:,2] = numpy.maximum(numpy.outer(numpy.cos(a), numpy.ones(segments + 1)) * 30.0, -15.0)
+	p0 = points[:-1,:-1].reshape((rings * segments, 1, 3))
+	p1 = points[1:,:-1].reshape((rings * segments, 1, 3))
+	p2 = points[1:,1:].reshape((rings * segments, 1, 3))
+	p3 = points[:-1,1:].reshape((rings * segments, 1, 3))
+	obj = mesh.printableObject(None)
+	m = obj._addMesh()
+	m.vertexes = numpy.concatenate((numpy.concatenate((p0, p1, p2), 1), numpy.concatenate((p0, p2, p3), 1))).reshape((rings * segments * 6, 3))
+	m.vertexCount = len(m.vertexes)
+	obj._postProcessAfterLoad()
+	obj.applyMatrix(matrix)
+	return obj
+
+#makePlate returns a list of objects with mixed sizes: mostly small parts, some medium and a few large ones. Or only small parts.
+def makePlate(count, seed, smallOnly = False):
+	rnd = random.Random(seed)
+	ret = []
+	for n in xrange(0, count):
+		kind = rnd.random()
+		if kind < 0.7 or smallOnly:
+			scale = 3.0 + rnd.random() * 7.0
+		elif kind < 0.95:
+			scale = 10.0 + rnd.random() * 20.0
+		else:
+			scale = 30.0 + rnd.random() * 30.0
+		size = (scale * (0.5 + rnd.random()), scale * (0.5 + rnd.random()), scale * (0.2 + rnd.random()))
+		ret.append(makeObject(size, rnd.random() * 90.0))
+	return ret
+
+def makeScene(machine):
+	machineSize, headSize = _machines[machine]
+	scene = objectScene.Scene()
+	scene.setMachineSize(numpy.array(machineSize, numpy.float32))
+	scene.setSizeOffsets(numpy.array([3.0, 3.0], numpy.float32))
+	scene.setHeadSize(*headSize)
+	return scene
+
+def _time(function, *args):
+	t = time.time()
+	function(*args)
+	return time.time() - t
+
+#benchmarkPlate runs all benchmarked operations on a plate of count objects, and returns a list of result dictionaries.
+# Adding objects one by one is only timed up to addLimit objects, larger plates are put in the scene directly.
+def benchmarkPlate(count, machine, seed = 0, addLimit = None):
+	profile.setTempOverride('machine_type', machine)
+	results = []
+	def result(operation, seconds):
+		results.append({'operation': operation, 'objects': count, 'machine': machine, 'seed': seed, 'seconds': round(seconds, 6)})
+
+	#Adding objects one by one, like loading files.
+	scene = makeScene(machine)
+	objs = makePlate(count, seed)
+	if addLimit is None or count <= addLimit:
+		result('add', _time(lambda : map(scene.add, objs)))
+	else:
+		scene._objectList = objs[:]
+
+	#Arrange a plate where all objects are at the center.
+	for obj in objs:
+		obj.setPosition(numpy.array([0.0, 0.0]))
+	result('arrangeAll', _time(scene.arrangeAll))
+	result('centerAll', _time(scene.centerAll))
+	result('checkPlatform', _time(lambda : map(scene.checkPlatform, objs)))
+	result('printOrder', _time(scene.printOrder))
+	result('printOrder-unchanged', _time(scene.printOrder))
+
+	#Move all objects a bit, so they overlap their neighbours, and push them free again.
+	rnd = random.Random(seed)
+	for obj in objs:
+		obj.setPosition(obj.getPosition() * 0.8 + numpy.array([rnd.random() - 0.5, rnd.random() - 0.5]))
+	result('pushFree', _time(scene.pushFree))
+
+	profile.clearTempOverride('machine_type')
+	return results
+
+#benchmarkLayFlat times laying a dense curved mesh of about faceCount faces flat from a random rotation, including building its convex hull.
+def benchmarkLayFlat(faceCount, seed = 0):
+	rnd = random.Random(seed)
+	matrix = numpy.matrix(numpy.linalg.qr(numpy.array([[rnd.gauss(0, 1) for n in xrange(0, 3)] for n in xrange(0, 3)]))[0], numpy.float64)
+	if numpy.linalg.det(matrix) < 0:
+		matrix[:,0] *= -1
+	obj = makeDenseObject(faceCount, matrix)
+	return [{'operation': 'layFlat', 'faces': obj._meshList[0].vertexCount / 3, 'seed': seed, 'seconds': round(_time(obj.layFlat), 6)}]
+
+#checkArrangeCoverage arranges a plate of count small objects with arrangeAll, and by adding the objects to the scene one by one.
+# Returns a result dictionary with the amount of objects that ended up on the platform for both.
+def checkArrangeCoverage(count, machine, seed = 0):
+	profile.setTempOverride('machine_type', machine)
+	scene = makeScene(machine)
+	objs = makePlate(count, seed, True)
+	scene._objectList = objs[:]
+	for obj in objs:
+		obj.setPosition(numpy.array([0.0, 0.0]))
+	scene.arrangeAll()
+	arranged = len(filter(scene.checkPlatform, objs))
+
+	scene = makeScene(machine)
+	for obj in objs:
+		obj.setPosition(numpy.array([0.0, 0.0]))
+		scene.add(obj)
+	added = len(filter(scene.checkPlatform, objs))
+	profile.clearTempOverride('machine_type')
+	return {'operation': 'arrangeCoverage', 'objects': count, 'machine': machine, 'seed': seed, 'arranged': arranged, 'added': added, 'ok': arranged >= added}
+
+def main():
+	parser = OptionParser(usage="usage: %prog [options]")
+	parser.add_option("-c", "--count", action="store", type="string", dest="count", default="10,30,100,300,1000",
+		help="Comma separated list of the amount of objects on a plate")
+	parser.add_option("-m", "--machine", action="store", type="string", dest="machine", default="ultimaker,ultimaker2",
+		help="Comma separated list of machines to benchmark on (%s)" % (', '.join(_machines.keys())))
+	parser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=0,
+		help="Seed for the random plates")
+	parser.add_option("-a", "--add-limit", action="store", type="int", dest="addLimit", default=300,
+		help="Only time adding objects one by one on plates up to this amount of objects, as it gets slow on large plates")
+	parser.add_option("-l", "--layflat-faces", action="store", type="string", dest="layFlatFaces", default="90000,360000",
+		help="Comma separated list of the amount of faces of the dense meshes to lay flat, empty to skip")
+	parser.add_option("-C", "--coverage", action="store", type="string", dest="coverage", default="60",
+		help="Comma separated list of the amount of small objects to check the arrangeAll coverage with, empty to skip")
+	(options, args) = parser.parse_args()
+
+	for machine in options.machine.split(','):
+		for count in map(int, options.count.split(',')):
+			for result in benchmarkPlate(count, machine, options.seed, options.addLimit):
+				print json.dumps(result, sort_keys=True)
+	for faceCount in map(int, filter(None, options.layFlatFaces.split(','))):
+		for result in benchmarkLayFlat(faceCount, options.seed):
+			print json.dumps(result, sort_keys=True)
+	failed = False
+	for machine in options.machine.split(','):
+		for count in map(int, filter(None, options.coverage.split(','))):
+			result = checkArrangeCoverage(count, machine, options.seed)
+			print json.dumps(result, sort_keys=True)
+			failed = failed or not result['ok']
+	if failed:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -14,6 +14,8 @@ import urllib2
 import hashlib
 
 from Cura.util import profile
+from Cura.util import meshAnalysis
+from Cura.util import gcodeCache
 from Cura.util import version
 
 def getEngineFilename():
@@ -49,6 +51,7 @@ class Slicer(object):
 		self._filamentMM = [0.0, 0.0]
 		self._modelHash = None
 		self._id = 0
+		self._extraStorageFilenames = []
 
 	def cleanup(self):
 		self.abortSlicer()
@@ -60,6 +63,11 @@ class Slicer(object):
 			os.remove(self._exportFilename)
 		except:
 			pass
+		for filename in self._extraStorageFilenames:
+			try:
+				os.remove(filename)
+			except:
+				pass
 
 	def abortSlicer(self):
 		if self._process is not None:
@@ -120,64 +128,115 @@ class Slicer(object):
 		if profile.getProfileSetting('support_dual_extrusion') == 'Second extruder':
 			extruderCount = max(extruderCount, 2)
 
+		settings = self._engineSettings(extruderCount)
 		commandList = [getEngineFilename(), '-vv']
-		for k, v in self._engineSettings(extruderCount).iteritems():
+		for k, v in sorted(settings.items()):
 			commandList += ['-s', '%s=%s' % (k, str(v))]
 		commandList += ['-o', self._exportFilename]
 		commandList += ['-b', self._binaryStorageFilename]
 		self._objCount = 0
-		with open(self._binaryStorageFilename, "wb") as f:
-			hash = hashlib.sha512()
-			order = scene.printOrder()
-			if order is None:
-				pos = numpy.array(profile.getMachineCenterCoords()) * 1000
-				commandList += ['-s', 'posx=%d' % int(pos[0]), '-s', 'posy=%d' % int(pos[1])]
+		repairMesh = profile.getProfileSetting('fix_horrible_repair_mesh') == 'True'
+		#Objects made with copy() share their meshes. Every unique mesh is only hashed once.
+		hash = hashlib.sha512()
+		hashedMeshes = set()
+		#The contents of the storage files that are not on the command line, for the gcode cache.
+		storageList = [repairMesh]
+		order = scene.printOrder()
+		if order is None:
+			pos = numpy.array(profile.getMachineCenterCoords()) * 1000
+			commandList += ['-s', 'posx=%d' % int(pos[0]), '-s', 'posy=%d' % int(pos[1])]
 
-				vertexTotal = 0
-				for obj in scene.objects():
-					if scene.checkPlatform(obj):
-						for mesh in obj._meshList:
+			vertexTotal = 0
+			for obj in scene.objects():
+				if scene.checkPlatform(obj):
+					for mesh in obj._meshList:
+						if repairMesh:
+							vertexTotal += len(meshAnalysis.getRepairedVertexes(mesh))
+						else:
 							vertexTotal += mesh.vertexCount
 
+			with open(self._binaryStorageFilename, "wb") as f:
 				f.write(numpy.array([vertexTotal], numpy.int32).tostring())
 				for obj in scene.objects():
 					if scene.checkPlatform(obj):
 						for mesh in obj._meshList:
-							vertexes = (numpy.matrix(mesh.vertexes, copy = False) * numpy.matrix(obj._matrix, numpy.float32)).getA()
-							vertexes -= obj._drawOffset
-							vertexes += numpy.array([obj.getPosition()[0], obj.getPosition()[1], 0.0])
-							f.write(vertexes.tostring())
-							hash.update(mesh.vertexes.tostring())
+							if repairMesh:
+								f.write(mesh.getTransformedVertexes(True, meshAnalysis.getRepairedVertexes(mesh)).tostring())
+							else:
+								f.write(mesh.getTransformedVertexes(True).tostring())
+							if id(mesh.vertexes) not in hashedMeshes:
+								hashedMeshes.add(id(mesh.vertexes))
+								hash.update(mesh.getDataHash())
+						#The vertexes are stored transformed.
+						storageList.append(self._meshHashes(obj) + (obj._matrix.getA().tolist(), obj.getPosition().tolist()))
 
-				commandList += ['#']
-				self._objCount = 1
-			else:
-				for n in order:
-					obj = scene.objects()[n]
-					for mesh in obj._meshList:
-						f.write(numpy.array([mesh.vertexCount], numpy.int32).tostring())
-						s = mesh.vertexes.tostring()
-						f.write(s)
-						hash.update(s)
-					pos = obj.getPosition() * 1000
-					pos += numpy.array(profile.getMachineCenterCoords()) * 1000
-					commandList += ['-m', ','.join(map(str, obj._matrix.getA().flatten()))]
-					commandList += ['-s', 'posx=%d' % int(pos[0]), '-s', 'posy=%d' % int(pos[1])]
-					commandList += ['#' * len(obj._meshList)]
-					self._objCount += 1
-			self._modelHash = hash.hexdigest()
+			commandList += ['#']
+			self._objCount = 1
+		else:
+			#When printing one at a time the engine gets the meshes untransformed, with the matrix of each object.
+			# So the meshes shared by copies are only written once, in a storage file of their own, and the engine
+			# opens that file again for every copy.
+			storageFilenames = {}
+			for n in order:
+				obj = scene.objects()[n]
+				key = tuple(map(lambda mesh: id(mesh.vertexes), obj._meshList))
+				if key not in storageFilenames:
+					if len(storageFilenames) < 1:
+						filename = self._binaryStorageFilename
+					else:
+						filename = '%s.%d' % (self._binaryStorageFilename, len(storageFilenames))
+						if filename not in self._extraStorageFilenames:
+							self._extraStorageFilenames.append(filename)
+					with open(filename, "wb") as f:
+						for mesh in obj._meshList:
+							if repairMesh:
+								vertexes = meshAnalysis.getRepairedVertexes(mesh)
+								f.write(numpy.array([len(vertexes)], numpy.int32).tostring())
+								f.write(vertexes.tostring())
+							else:
+								f.write(numpy.array([mesh.vertexCount], numpy.int32).tostring())
+								f.write(mesh.vertexes.tostring())
+							if id(mesh.vertexes) not in hashedMeshes:
+								hashedMeshes.add(id(mesh.vertexes))
+								hash.update(mesh.getDataHash())
+					storageFilenames[key] = filename
+					storageList.append(self._meshHashes(obj))
+				pos = obj.getPosition() * 1000
+				pos += numpy.array(profile.getMachineCenterCoords()) * 1000
+				commandList += ['-b', storageFilenames[key]]
+				commandList += ['-m', ','.join(map(str, obj._matrix.getA().flatten()))]
+				commandList += ['-s', 'posx=%d' % int(pos[0]), '-s', 'posy=%d' % int(pos[1])]
+				commandList += ['#' * len(obj._meshList)]
+				self._objCount += 1
+		self._modelHash = hash.hexdigest()
 		if self._objCount > 0:
-			self._thread = threading.Thread(target=self._watchProcess, args=(commandList, self._thread))
+			#The cache key uses the full command line, with the temporary filenames replaced by their place in the list of temporary files.
+			tempFilenames = [self._exportFilename, self._binaryStorageFilename] + self._extraStorageFilenames
+			argumentList = map(lambda arg: '<tmp%d>' % (tempFilenames.index(arg)) if arg in tempFilenames else arg, commandList[1:])
+			cacheKey = gcodeCache.getKey(commandList[0], self._modelHash, argumentList + storageList)
+			self._thread = threading.Thread(target=self._watchProcess, args=(commandList, cacheKey, self._thread))
 			self._thread.daemon = True
 			self._thread.start()
 
-	def _watchProcess(self, commandList, oldThread):
+	#_meshHashes returns the hashes of the meshes of an object, as used in the gcode cache key.
+	def _meshHashes(self, obj):
+		return tuple(map(lambda mesh: mesh.getDataHash().encode('hex'), obj._meshList))
+
+	def _watchProcess(self, commandList, cacheKey, oldThread):
 		if oldThread is not None:
 			if self._process is not None:
 				self._process.terminate()
 			oldThread.join()
 		self._id += 1
 		self._callback(-1.0, False)
+		result = gcodeCache.loadGCode(cacheKey, self._exportFilename)
+		if result is not None:
+			#No engine runs for this result, so there is no process to terminate later.
+			self._process = None
+			self._sliceLog = []
+			self._printTimeSeconds, self._filamentMM = result
+			self._finishSlice()
+			return
 		try:
 			self._process = self._runSliceProcess(commandList)
 		except OSError:
@@ -227,20 +286,28 @@ class Slicer(object):
 		for line in self._process.stderr:
 			self._sliceLog.append(line.strip())
 		returnCode = self._process.wait()
-		try:
-			if returnCode == 0:
-				pluginError = profile.runPostProcessingPlugins(self._exportFilename)
-				if pluginError is not None:
-					print pluginError
-					self._sliceLog.append(pluginError)
-				self._callback(1.0, True)
-			else:
+		if returnCode == 0:
+			#Cache the gcode before the post processing plugins change it, the plugins are run on cached results as well.
+			gcodeCache.storeGCode(cacheKey, self._exportFilename, self._printTimeSeconds, self._filamentMM)
+			self._finishSlice()
+		else:
+			try:
 				for line in self._sliceLog:
 					print line
 				self._callback(-1.0, False)
+			except:
+				pass
+		self._process = None
+
+	def _finishSlice(self):
+		try:
+			pluginError = profile.runPostProcessingPlugins(self._exportFilename)
+			if pluginError is not None:
+				print pluginError
+				self._sliceLog.append(pluginError)
+			self._callback(1.0, True)
 		except:
 			pass
-		self._process = None
 
 	def _engineSettings(self, extruderCount):
 		settings = {